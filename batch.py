@@ -0,0 +1,95 @@
+"""Przeliczenie wszystkich portfeli bez przeglądarki.
+
+    python batch.py [--owners kamil ola] [--workers 4]
+
+Transakcje (arkusz albo baza SQLite - SUITSY_STORAGE) czytane są raz, notowania pobierane raz
+dla sumy tickerów wszystkich użytkowników, a wyniki poszczególnych właścicieli liczone równolegle
+w puli procesów i zapisywane jako migawki (data/snapshots.py), które UI wczytuje przy pierwszej wizycie."""
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from core.ingest import parse_transactions
+from core.portfolio import compute_portfolio, history_start
+from data.market import BENCHMARKS, load_market_data
+from data.storage import all_user_data
+from data.snapshots import write_snapshot
+
+logger = logging.getLogger("suitsy.batch")
+
+# Notowania wspólne dla wszystkich zadań - przekazywane raz na proces (initializer), nie z każdym zadaniem
+_market = None
+
+
+def _init_worker(market):
+    global _market
+    _market = market
+
+
+def compute_owner(owner, df, revision, directory=None):
+    hist_p, hist_f, hist_b, live_p, live_f = _market
+    start = time.perf_counter()
+    result = compute_portfolio(df, hist_p, hist_f, hist_b, live_p, live_f)
+    path = write_snapshot(owner, revision, result, directory)
+    value = float(result['equity'].iloc[-1]) if len(result['equity']) else 0.0
+    return {'owner': owner, 'rows': len(df), 'value': value, 'path': path, 'seconds': time.perf_counter() - start}
+
+
+def run_batch(owners=None, workers=None, directory=None):
+    revision, portfolios = all_user_data()
+    if owners:
+        wanted = {o.strip().lower() for o in owners}
+        portfolios = {o: rows for o, rows in portfolios.items() if o in wanted}
+    frames = {}
+    for owner, rows in portfolios.items():
+        df, rejected = parse_transactions(rows)
+        if not rejected.empty:
+            logger.warning("%s: pominięto %d wierszy z błędami (pozycje %s)", owner, len(rejected),
+                           ", ".join(map(str, rejected['Pozycja'])))
+        if not df.empty:
+            frames[owner] = df
+    if not frames:
+        return []
+
+    everything = pd.concat(frames.values(), ignore_index=True)
+    # Najwcześniejszy początek historii spośród portfeli - młody portfel sięga rok wstecz, jak w UI
+    market = load_market_data(
+        everything['Symbol'].unique().tolist(),
+        everything['Waluta'].unique().tolist(),
+        list(BENCHMARKS),
+        min(history_start(df['Data_Zakupu'].min()) for df in frames.values())
+    )
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(market,)) as pool:
+        futures = {pool.submit(compute_owner, o, df, revision, directory): o for o, df in frames.items()}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error("Błąd przeliczenia portfela %s: %s", futures[future], e)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Przeliczenie wszystkich portfeli i zapis migawek dla UI.")
+    parser.add_argument('--owners', nargs='+', help="tylko wybrani właściciele (domyślnie wszyscy)")
+    parser.add_argument('--workers', type=int, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument('--output-dir', help="katalog migawek (domyślnie SUITSY_SNAPSHOT_DIR)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    start = time.perf_counter()
+    results = run_batch(args.owners, args.workers, args.output_dir)
+    for r in sorted(results, key=lambda r: r['owner']):
+        logger.info("%-20s %5d transakcji  %14s PLN  %.2fs", r['owner'], r['rows'], f"{r['value']:,.0f}", r['seconds'])
+    logger.info("Przeliczono %d portfeli w %.1fs", len(results), time.perf_counter() - start)
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""Kontrole zgodności silników obliczeń na syntetycznych portfelach (bez sieci).
+
+    python -m benchmarks.checks --lots 200 --symbols 20 --seed 0
+
+Każda kontrola porównuje szybszą ścieżkę z wynikiem referencyjnym (pierwotna implementacja albo wzór zamknięty);
+kod wyjścia 1, jeśli któraś się nie zgadza."""
+import argparse
+import sys
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_portfolio
+from core.fx import fx_matrix, live_rates
+from core.ingest import parse_transactions
+from core.metrics import (calculate_benchmark_roi, calculate_portfolio_history, calculate_portfolio_metrics,
+                          calculate_roi)
+from core.portfolio import IncrementalHistory
+from core.returns import DAYS_PER_YEAR, MIN_XIRR_DAYS, group_xirr
+
+RTOL = 1e-9
+
+
+def legacy_portfolio_history(df, hist_prices, hist_fx):
+    """Pierwotny silnik krzywej kapitału (pętla po transakcjach) - punkt odniesienia dla wersji macierzowej."""
+    total_equity = pd.Series(0.0, index=hist_prices.index)
+    total_cost = pd.Series(0.0, index=hist_prices.index)
+    equity_map = {}
+    for _, row in df.iterrows():
+        symbol, currency = row['Symbol'], row['Waluta']
+        if symbol not in hist_prices.columns:
+            continue
+        asset_prices = hist_prices[symbol].ffill().bfill()
+        fx_history = pd.Series(1.0, index=hist_prices.index)
+        if currency != 'PLN':
+            fx_history = hist_fx[f"{currency}PLN=X"].reindex(hist_prices.index).ffill().bfill()
+
+        pos_val = asset_prices * row['Ilosc'] * fx_history
+        mask = pos_val.index >= pd.to_datetime(row['Data_Zakupu'])
+        pos_cost = pd.Series(0.0, index=hist_prices.index)
+        pos_cost[mask] = row['Kwota_Poczatkowa_PLN']
+        pos_val[~mask] = 0
+
+        total_equity = total_equity.add(pos_val, fill_value=0)
+        total_cost = total_cost.add(pos_cost, fill_value=0)
+        equity_map[symbol] = equity_map.get(symbol, pd.Series(0.0, index=hist_prices.index)).add(pos_val, fill_value=0)
+    return total_equity, total_cost, equity_map
+
+
+def _legacy_float(val):
+    try:
+        if val is None: return 0.0
+        if isinstance(val, (int, float)): return float(val)
+        val = str(val).replace(',', '.').replace(' ', '').strip()
+        return float(val) if val != "" else 0.0
+    except:
+        return 0.0
+
+
+def _legacy_date(val):
+    try:
+        if isinstance(val, (datetime, date)): return val if isinstance(val, date) else val.date()
+        val = str(val).strip()
+        for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y.%m.%d'):
+            try:
+                return datetime.strptime(val, fmt).date()
+            except:
+                continue
+    except:
+        pass
+    return datetime.now().date()
+
+
+def legacy_parse_transactions(raw):
+    """Pierwotna ingestia (safe_float/safe_date komórka po komórce) - punkt odniesienia dla core/ingest.py."""
+    df = pd.DataFrame(raw)
+    df['Ilosc'] = df['Ilosc'].apply(_legacy_float)
+    df['Kwota_Poczatkowa_PLN'] = df['Kwota_Poczatkowa_PLN'].apply(_legacy_float)
+    df['Data_Zakupu'] = df['Data_Zakupu'].apply(_legacy_date)
+    return df
+
+
+def legacy_portfolio_metrics(df, hist_prices, live_prices_map, live_fx_map):
+    """Pierwotne metryki pozycji (funkcje wierszowe) - punkt odniesienia dla wersji kolumnowej."""
+    df = df.copy()
+
+    def get_price(symbol):
+        price = live_prices_map.get(symbol, 0.0)
+        if price <= 0 and not hist_prices.empty and symbol in hist_prices.columns:
+            price = hist_prices[symbol].ffill().iloc[-1]
+        return float(price) if pd.notna(price) else 0.0
+
+    df['Cena_Live'] = df['Symbol'].apply(get_price).astype(float)
+    df['Kurs_Live'] = df['Waluta'].apply(lambda c: live_fx_map.get(c, 1.0)).astype(float)
+    df['Wartosc_PLN'] = df['Ilosc'] * df['Cena_Live'] * df['Kurs_Live']
+    df['Zysk_PLN'] = df.apply(
+        lambda r: r['Wartosc_PLN'] - r['Kwota_Poczatkowa_PLN'] if r['Cena_Live'] > 0 else 0.0, axis=1)
+    df['Zysk_Proc'] = df.apply(
+        lambda r: (r['Zysk_PLN'] / r['Kwota_Poczatkowa_PLN'] * 100)
+        if (r['Kwota_Poczatkowa_PLN'] > 0 and r['Cena_Live'] > 0) else 0.0, axis=1)
+    return df
+
+
+def legacy_benchmark_roi(hist_b, equity_index, first_trade_date):
+    """Pierwotna pętla po benchmarkach z suitsy_pro.py - punkt odniesienia dla calculate_benchmark_roi."""
+    b_roi = {}
+    for b in hist_b.columns:
+        bd = hist_b[[b]].dropna()
+        if not bd.empty:
+            aligned = bd.reindex(equity_index).ffill().bfill()
+            try:
+                price_at_start = aligned.loc[first_trade_date].iloc[0]
+                b_roi[b] = (aligned.iloc[:, 0] / price_at_start - 1) * 100
+                b_roi[b].loc[:first_trade_date] = 0
+            except Exception:
+                b_roi[b] = (aligned.iloc[:, 0] / aligned.iloc[0, 0] - 1) * 100
+    return b_roi
+
+
+def _same_history(got, expected):
+    (eq, cost, eq_map), (ref_eq, ref_cost, ref_map) = got, expected
+    return (eq.index.equals(ref_eq.index) and np.allclose(eq, ref_eq, rtol=RTOL)
+            and np.array_equal(cost.to_numpy() > 0, ref_cost.to_numpy() > 0)
+            and np.allclose(cost, ref_cost, rtol=RTOL) and set(eq_map) == set(ref_map)
+            and all(np.allclose(eq_map[s], ref_map[s], rtol=RTOL) for s in ref_map)
+            and calculate_roi(eq, cost)[1] == calculate_roi(ref_eq, ref_cost)[1])
+
+
+def check_matrix_engine(df, data, rng):
+    """calculate_portfolio_history (macierz dni × transakcje) = pierwotna pętla po transakcjach."""
+    hist_p, hist_f = data['hist_prices'], data['hist_fx']
+    return _same_history(calculate_portfolio_history(df, hist_p, hist_f), legacy_portfolio_history(df, hist_p, hist_f))
+
+
+def check_incremental(df, data, rng):
+    """IncrementalHistory po dodaniu wszystkich transakcji, a potem usunięciu losowej połowy
+    (w tym najwcześniejszych) = calculate_portfolio_history na pozostałych."""
+    hist_p, hist_f = data['hist_prices'], data['hist_fx']
+    engine = IncrementalHistory()
+    engine.update(df, hist_p, hist_f)
+    if not _same_history(engine.update(df, hist_p, hist_f), calculate_portfolio_history(df, hist_p, hist_f)):
+        return False
+    oldest = df.sort_values('Data_Zakupu').index[:max(1, len(df) // 10)]
+    drop = oldest.union(pd.Index(rng.choice(df.index, len(df) // 2, replace=False)))
+    rest = df.drop(drop)
+    return _same_history(engine.update(rest, hist_p, hist_f), calculate_portfolio_history(rest, hist_p, hist_f))
+
+
+def check_ingest(df, data, rng):
+    """parse_transactions (kolumnowo, wg schematu) = pierwotne safe_float/safe_date dla poprawnych wierszy arkusza."""
+    ref = legacy_parse_transactions(data['raw'])
+    return (len(df) == len(ref)
+            and np.array_equal(df['Ilosc'].to_numpy(), ref['Ilosc'].to_numpy())
+            and np.array_equal(df['Kwota_Poczatkowa_PLN'].to_numpy(), ref['Kwota_Poczatkowa_PLN'].to_numpy())
+            and (df['Data_Zakupu'] == pd.to_datetime(ref['Data_Zakupu'])).all()
+            and all((df[c].astype(str) == ref[c].astype(str)).all() for c in ('Symbol', 'Waluta')))
+
+
+def check_categorical_columns(df, data, rng):
+    """Metryki i krzywa kapitału dla Symbol/Waluta jako kategorii = te same obliczenia na kolumnach tekstowych."""
+    hist_p, hist_f = data['hist_prices'], data['hist_fx']
+    plain = df.astype({'Symbol': object, 'Waluta': object})
+    as_of = hist_p.index[-1]
+    got = calculate_portfolio_metrics(df, hist_p, data['live_prices'], data['live_fx'], as_of)
+    ref = calculate_portfolio_metrics(plain, hist_p, data['live_prices'], data['live_fx'], as_of)
+    columns = ['Cena_Live', 'Kurs_Live', 'Wartosc_PLN', 'Zysk_PLN', 'Zysk_Proc', 'XIRR_Proc']
+    return (np.allclose(got[columns], ref[columns], rtol=RTOL, equal_nan=True)
+            and _same_history(calculate_portfolio_history(df, hist_p, hist_f),
+                              calculate_portfolio_history(plain, hist_p, hist_f)))
+
+
+def check_metrics(df, data, rng):
+    """calculate_portfolio_metrics (kolumnowo) = pierwotne funkcje wierszowe, także dla symboli bez notowania live
+    (cena z historii) i bez żadnej ceny (wartość 0, zysk 0)."""
+    hist_p = data['hist_prices']
+    symbols = list(hist_p.columns)
+    no_live = rng.choice(symbols, len(symbols) // 4, replace=False)
+    live = {s: p for s, p in data['live_prices'].items() if s not in no_live}
+    # Symbol bez historii i bez notowania live
+    hist_p = hist_p.drop(columns=symbols[-1])
+    live.pop(symbols[-1], None)
+
+    got = calculate_portfolio_metrics(df, hist_p, live, data['live_fx'])
+    ref = legacy_portfolio_metrics(df, hist_p, live, data['live_fx'])
+    columns = ['Cena_Live', 'Kurs_Live', 'Wartosc_PLN', 'Zysk_PLN', 'Zysk_Proc']
+    return np.allclose(got[columns], ref[columns], rtol=RTOL)
+
+
+def check_benchmark_roi(df, data, rng):
+    """calculate_benchmark_roi (jedna macierz) = pierwotna pętla po benchmarkach, także dla benchmarku
+    notowanego w weekendy i debiutującego po pierwszej transakcji."""
+    equity, cost, _ = calculate_portfolio_history(df, data['hist_prices'], data['hist_fx'])
+    _, first_trade_date = calculate_roi(equity, cost)
+    hist_b = data['hist_bench'].copy()
+    hist_b.iloc[:len(hist_b) // 2, -1] = np.nan
+    days = pd.date_range(hist_b.index[0], hist_b.index[-1])
+    crypto = pd.Series(30_000 * np.exp(np.cumsum(rng.normal(0, 0.03, len(days)))), index=days, name='Bitcoin')
+    hist_b = hist_b.join(crypto, how='outer')
+
+    got = calculate_benchmark_roi(hist_b, equity.index, first_trade_date)
+    ref = legacy_benchmark_roi(hist_b, equity.index, first_trade_date)
+    return (list(got.columns) == list(ref)
+            and all(np.allclose(got[b], ref[b], rtol=RTOL, atol=1e-9) for b in ref))
+
+
+def check_fx_cross_rates(df, data, rng):
+    """Kurs krzyżowy GBP przez USD lub EUR, kurs z pary odwrotnej i z notacji Yahoo "XXX=X" = para bezpośrednia GBPPLN."""
+    index = data['hist_prices'].index
+    walk = lambda level: pd.Series(level * np.exp(np.cumsum(rng.normal(0, 0.004, len(index)))), index=index)
+    usd, eur, gbp = walk(4.0), walk(4.3), walk(5.0)
+    variants = [
+        {'GBPUSD=X': gbp / usd, 'USDPLN=X': usd},
+        {'GBPEUR=X': gbp / eur, 'EURPLN=X': eur},
+        {'USDGBP=X': usd / gbp, 'USDPLN=X': usd},
+        {'GBP=X': usd / gbp, 'USDPLN=X': usd},
+        {'PLNGBP=X': 1 / gbp},
+    ]
+    for pairs in variants:
+        rates = fx_matrix(pd.DataFrame(pairs), ['GBP'], index)['GBP']
+        live, missing = live_rates(['GBP'], {k: v.iloc[-1] for k, v in pairs.items()})
+        if missing or not np.allclose(rates, gbp, rtol=RTOL) or not np.isclose(live['GBP'], gbp.iloc[-1], rtol=RTOL):
+            return False
+    return True
+
+
+def check_fx_missing_rate(df, data, rng):
+    """Waluta bez żadnego kursu zostaje bez wyceny (NaN, zgłoszona jako brakująca) zamiast liczyć się po 1.0;
+    krzywa kapitału pomija jej pozycje."""
+    hist_p, hist_f = data['hist_prices'], data['hist_fx']
+    if not fx_matrix(hist_f, ['XYZ'], hist_p.index)['XYZ'].isna().all():
+        return False
+    live, missing = live_rates(['PLN', 'XYZ'], data['live_fx'], hist_f)
+    if missing != ['XYZ'] or 'XYZ' in live:
+        return False
+
+    odd = rng.choice(df.index, max(1, len(df) // 10), replace=False)
+    mixed = df.astype({'Waluta': object})
+    mixed.loc[odd, 'Waluta'] = 'XYZ'
+    metrics = calculate_portfolio_metrics(mixed, hist_p, data['live_prices'], data['live_fx'])
+    unpriced = metrics.index.isin(odd)
+    return (metrics.loc[unpriced, 'Wartosc_PLN'].isna().all() and metrics.loc[~unpriced, 'Wartosc_PLN'].notna().all()
+            and _same_history(calculate_portfolio_history(mixed, hist_p, hist_f),
+                              calculate_portfolio_history(mixed[~unpriced], hist_p, hist_f)))
+
+
+def bisection_xirr(cost, years, value, iterations=200):
+    """XIRR (% rocznie) jednej grupy czystą bisekcją: zakupy cost sprzed years lat, wycena value dziś."""
+    def npv(rate):
+        return value - np.sum(cost * (1 + rate) ** years)
+    lo, hi = -1 + 1e-12, 1.0
+    while npv(hi) > 0:
+        hi *= 2
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        lo, hi = (mid, hi) if npv(mid) > 0 else (lo, mid)
+    return (lo + hi) / 2 * 100
+
+
+def check_xirr_closed_form(df, data, rng):
+    """Jedna wpłata i wycena: group_xirr = (wartość / koszt) ** (1 / lata) - 1, także przy stratach i dużych zyskach."""
+    n = 500
+    as_of = pd.Timestamp('2024-06-30')
+    cost = rng.uniform(100, 10_000, n)
+    value = cost * np.where(rng.random(n) < 0.5, rng.uniform(0.05, 0.99, n), rng.uniform(1.0, 50.0, n))
+    days = rng.integers(MIN_XIRR_DAYS, 20 * 365, n)
+    got = group_xirr(cost, value, as_of - pd.to_timedelta(days, unit='D'), np.arange(n), as_of)
+    expected = ((value / cost) ** (DAYS_PER_YEAR / days) - 1) * 100
+    return np.allclose(got.to_numpy(), expected, rtol=1e-7, atol=1e-9)
+
+
+def check_xirr_bisection(df, data, rng):
+    """Wiele wpłat w grupie (symbol portfela): group_xirr = stopa znaleziona czystą bisekcją."""
+    as_of = pd.Timestamp(df['Data_Zakupu'].max()).normalize() + pd.Timedelta(days=MIN_XIRR_DAYS)
+    value = df['Kwota_Poczatkowa_PLN'].to_numpy() * rng.uniform(0.3, 3.0, len(df))
+    got = group_xirr(df['Kwota_Poczatkowa_PLN'], value, df['Data_Zakupu'], df['Symbol'].astype(str), as_of)
+
+    years = (as_of - pd.to_datetime(df['Data_Zakupu'])).dt.days.to_numpy() / DAYS_PER_YEAR
+    symbols = df['Symbol'].astype(str).to_numpy()
+    for symbol, rate in got.items():
+        mask = symbols == symbol
+        ref = bisection_xirr(df['Kwota_Poczatkowa_PLN'].to_numpy()[mask], years[mask], value[mask].sum())
+        if not np.isclose(rate, ref, rtol=1e-6, atol=1e-8):
+            return False
+    return True
+
+
+def check_xirr_no_sign_change(df, data, rng):
+    """Przepływy bez zmiany znaku (sama wpłata albo sama wycena) nie mają XIRR - wynik NaN, nie 0 ani -100%."""
+    as_of = pd.Timestamp('2024-06-30')
+    bought = [as_of - pd.Timedelta(days=800)] * 4
+    got = group_xirr([1000.0, 0.0, 500.0, 0.0], [0.0, 1500.0, 0.0, 0.0], bought, ['a', 'b', 'c', 'd'], as_of)
+    return bool(got.isna().all())
+
+
+def check_xirr_min_days(df, data, rng):
+    """Grupy krótsze niż MIN_XIRR_DAYS mają NaN; od MIN_XIRR_DAYS dni (najstarsza wpłata grupy) - wynik liczbowy."""
+    as_of = pd.Timestamp('2024-06-30')
+    days = [MIN_XIRR_DAYS - 1, MIN_XIRR_DAYS, 30, MIN_XIRR_DAYS + 10, 5]
+    bought = [as_of - pd.Timedelta(days=d) for d in days]
+    got = group_xirr([1000.0] * 5, [1100.0] * 5, bought, ['krótki', 'rok', 'mieszany', 'mieszany', 'nowy'], as_of)
+    return bool(np.isnan(got['krótki']) and np.isnan(got['nowy'])
+                and np.isclose(got['rok'], 10.0) and np.isfinite(got['mieszany']))
+
+
+CHECKS = {
+    'matrix_vs_legacy_history': check_matrix_engine,
+    'incremental_add_delete': check_incremental,
+    'ingest_vs_legacy': check_ingest,
+    'categorical_columns': check_categorical_columns,
+    'metrics_vs_legacy': check_metrics,
+    'benchmark_roi_vs_legacy': check_benchmark_roi,
+    'fx_cross_rates': check_fx_cross_rates,
+    'fx_missing_rate': check_fx_missing_rate,
+    'xirr_closed_form': check_xirr_closed_form,
+    'xirr_vs_bisection': check_xirr_bisection,
+    'xirr_no_sign_change': check_xirr_no_sign_change,
+    'xirr_min_days': check_xirr_min_days,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kontrole zgodności silników obliczeń Suitsy.")
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--currencies', type=int, default=3)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    data = synthetic_portfolio(args.lots, args.symbols, args.currencies, args.years, args.seed)
+    df, _ = parse_transactions(data['raw'])
+    failed = []
+    for name, check in CHECKS.items():
+        ok = check(df, data, np.random.default_rng(args.seed))
+        print(f"{name:<28} {'OK' if ok else 'BŁĄD'}")
+        if not ok:
+            failed.append(name)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
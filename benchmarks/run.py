@@ -0,0 +1,127 @@
+"""Benchmark potoku obliczeń na syntetycznych portfelach (bez sieci).
+
+    python -m benchmarks.run --lots 100 1000 10000 --symbols 50 --years 10 --output wyniki.json
+
+Wynik to JSON: parametry, wersje bibliotek i czasy (best/median) każdego etapu dla każdego rozmiaru."""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from benchmarks.synthetic import synthetic_portfolio
+from core import analytics
+from core.downsample import build_pyramid, downsample
+from core.ingest import parse_transactions
+from core.metrics import calculate_portfolio_metrics, calculate_portfolio_history, calculate_benchmark_roi
+from core.portfolio import IncrementalHistory
+from core.returns import group_xirr, time_weighted_return
+from ui.charts import equity_figure, roi_figure
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return out, times
+
+
+def run_case(lots, symbols, currencies, years, repeat, seed):
+    data = synthetic_portfolio(lots, symbols, currencies, years, seed)
+    hist_p, hist_f, hist_b = data['hist_prices'], data['hist_fx'], data['hist_bench']
+    results = []
+
+    def stage(name, fn, **extra):
+        out, times = measure(fn, repeat)
+        results.append(dict(stage=name, best_s=min(times), median_s=statistics.median(times), **extra))
+        return out
+
+    df, _ = stage('ingest', lambda: parse_transactions(data['raw']), rows=lots)
+    stage('metrics', lambda: calculate_portfolio_metrics(df, hist_p, data['live_prices'], data['live_fx']), rows=lots)
+    equity, cost, eq_map = stage('history', lambda: calculate_portfolio_history(df, hist_p, hist_f),
+                                 rows=lots, days=len(hist_p))
+
+    # Przyrostowo: dopisanie jednej transakcji do już policzonej krzywej
+    def incremental():
+        engine = IncrementalHistory()
+        engine.update(df.iloc[:-1], hist_p, hist_f)
+        start = time.perf_counter()
+        engine.update(df, hist_p, hist_f)
+        return time.perf_counter() - start
+    times = [incremental() for _ in range(repeat)]
+    results.append(dict(stage='history_append_one', rows=1, best_s=min(times), median_s=statistics.median(times)))
+
+    metrics = calculate_portfolio_metrics(df, hist_p, data['live_prices'], data['live_fx'])
+    flows = metrics['Kwota_Poczatkowa_PLN'], metrics['Wartosc_PLN'], metrics['Data_Zakupu']
+    stage('xirr_lots', lambda: group_xirr(*flows, metrics.index), rows=lots)
+    stage('xirr_positions', lambda: group_xirr(*flows, metrics['Symbol']), rows=lots)
+    stage('twr', lambda: time_weighted_return(equity, cost), days=len(equity))
+
+    first_trade = cost[cost > 0].index[0]
+    bench_roi = stage('benchmark_roi', lambda: calculate_benchmark_roi(hist_b, equity.index, first_trade),
+                      rows=hist_b.shape[1])
+
+    def risk():
+        analytics._cache.clear()
+        return analytics.calculate_risk_metrics(equity, cost, hist_b)
+    stage('risk', risk, days=len(equity))
+
+    eq_df = pd.DataFrame(eq_map).fillna(0)
+    sampled = stage('downsample', lambda: downsample(build_pyramid(eq_df)), rows=eq_df.size)
+    fig = stage('figure_equity', lambda: equity_figure(sampled), points=sampled.size)
+    payload = stage('serialize_equity', lambda: fig.to_json())
+    results[-1]['payload_bytes'] = len(payload)
+
+    roi = (equity / cost.where(cost > 0) - 1).fillna(0) * 100
+    fig = stage('figure_roi', lambda: roi_figure(roi, bench_roi), points=len(roi) * (bench_roi.shape[1] + 1))
+    payload = stage('serialize_roi', lambda: fig.to_json())
+    results[-1]['payload_bytes'] = len(payload)
+
+    params = dict(lots=lots, symbols=symbols, currencies=currencies, years=years)
+    return [dict(params, **r) for r in results]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark potoku obliczeń Suitsy na syntetycznych danych.")
+    parser.add_argument('--lots', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[50])
+    parser.add_argument('--currencies', type=int, nargs='+', default=[3])
+    parser.add_argument('--years', type=int, nargs='+', default=[10])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="plik wynikowy JSON (domyślnie stdout)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for lots, symbols, currencies, years in itertools.product(args.lots, args.symbols, args.currencies, args.years):
+        print(f"lots={lots} symbols={symbols} currencies={currencies} years={years}", file=sys.stderr)
+        results.extend(run_case(lots, symbols, currencies, years, args.repeat, args.seed))
+
+    report = {
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'environment': {
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'plotly': plotly.__version__,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
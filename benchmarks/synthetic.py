@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Generator syntetycznych portfeli do benchmarków - bez sieci, deterministyczny dla danego ziarna
+END_DATE = pd.Timestamp("2024-12-31")
+CURRENCIES = ('PLN', 'USD', 'EUR', 'GBP', 'CHF', 'JPY', 'SEK', 'NOK')
+FX_LEVELS = {'USD': 4.0, 'EUR': 4.3, 'GBP': 5.0, 'CHF': 4.4, 'JPY': 0.027, 'SEK': 0.38, 'NOK': 0.37}
+BENCHMARK_NAMES = ('S&P 500', 'WIG20', 'Złoto')
+# Formaty dat i liczb spotykane w arkuszu - ingestia ma je wszystkie przejść
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y.%m.%d')
+LATE_LISTING_SHARE = 0.1
+
+
+def _random_walk(rng, index, columns, levels, vol):
+    steps = rng.normal(0.0002, vol, (len(index), len(columns)))
+    return pd.DataFrame(levels * np.exp(np.cumsum(steps, axis=0)), index=index, columns=columns)
+
+
+def synthetic_portfolio(lots=1000, symbols=50, currencies=3, years=10, seed=0):
+    """Surowe wiersze arkusza (jak z load_user_data) i ramki notowań dla zadanego rozmiaru portfela.
+    Zwraca słownik: raw, hist_prices, hist_fx, hist_bench, live_prices, live_fx."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=END_DATE, periods=int(years * 252))
+    codes = list(CURRENCIES[:max(1, min(currencies, len(CURRENCIES)))])
+
+    names = [f"SYM{i:04d}" for i in range(symbols)]
+    symbol_ccy = rng.choice(codes, symbols)
+    hist_prices = _random_walk(rng, index, names, rng.uniform(10, 500, symbols), 0.015)
+    # Część instrumentów debiutuje później - NaN na początku historii, jak przy prawdziwych IPO
+    late = rng.random(symbols) < LATE_LISTING_SHARE
+    for j in np.flatnonzero(late):
+        hist_prices.iloc[:rng.integers(1, len(index) // 2), j] = np.nan
+
+    foreign = [c for c in codes if c != 'PLN']
+    hist_fx = _random_walk(rng, index, [f"{c}PLN=X" for c in foreign],
+                           np.array([FX_LEVELS[c] for c in foreign]), 0.003)
+    hist_bench = _random_walk(rng, index, list(BENCHMARK_NAMES), np.array([4000.0, 2000.0, 1800.0]), 0.01)
+
+    # Transakcje: losowy symbol i dzień z notowaniem; kwota w PLN z ceny i kursu z dnia zakupu
+    sym_idx = rng.integers(0, symbols, lots)
+    first_valid = hist_prices.notna().to_numpy().argmax(axis=0)
+    day_idx = (first_valid[sym_idx] + rng.random(lots) * (len(index) - first_valid[sym_idx])).astype(int)
+    qty = np.round(rng.uniform(1, 100, lots), 2)
+    price = hist_prices.to_numpy()[day_idx, sym_idx]
+    ccy = symbol_ccy[sym_idx]
+    fx = np.ones(lots)
+    for c in foreign:
+        mask = ccy == c
+        fx[mask] = hist_fx[f"{c}PLN=X"].to_numpy()[day_idx[mask]]
+    amount = qty * price * fx
+
+    formats = rng.choice(DATE_FORMATS, lots)
+    raw = [{
+        'Symbol': names[s],
+        'Data_Zakupu': index[d].strftime(f),
+        'Waluta': c,
+        'Ilosc': f"{q:.2f}".replace('.', ',') if i % 2 else q,
+        'Kwota_Poczatkowa_PLN': f"{a:.2f}".replace('.', ','),
+        'Notatka': "" if i % 3 else f"Transakcja {i}",
+    } for i, (s, d, c, q, a, f) in enumerate(zip(sym_idx, day_idx, ccy, qty, amount, formats))]
+
+    live_prices = (hist_prices.ffill().iloc[-1] * (1 + rng.normal(0, 0.01, symbols))).to_dict()
+    live_fx = {'PLN': 1.0}
+    live_fx.update({c: float(hist_fx[f"{c}PLN=X"].iloc[-1]) for c in foreign})
+    return {
+        'raw': raw, 'hist_prices': hist_prices, 'hist_fx': hist_fx, 'hist_bench': hist_bench,
+        'live_prices': live_prices, 'live_fx': live_fx,
+    }
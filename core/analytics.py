@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.digest import digest
+
+TRADING_DAYS = 252
+ROLLING_WINDOW = 63  # ~ kwartał sesji
+_CACHE_SIZE = 32
+_cache = OrderedDict()
+_cache_lock = threading.Lock()   # wspólny dla wątków sesji streamlit
+
+
+def flow_adjusted_returns(equity, cost):
+    """Dzienne stopy zwrotu bez wpływu wpłat: (E_t - E_t-1 - wpłata_t) / E_t-1.
+    Przed pierwszą transakcją (i przy zerowej wartości poprzedniego dnia) - NaN."""
+    e = equity.to_numpy(dtype=float)
+    flows = np.diff(cost.to_numpy(dtype=float), prepend=0.0)
+    prev = np.roll(e, 1)
+    prev[0] = 0.0
+    r = np.divide(e - prev - flows, prev, out=np.full(len(e), np.nan), where=prev > 0)
+    return pd.Series(r, index=equity.index)
+
+
+def drawdown_series(wealth):
+    """Obsunięcie (%) od szczytu oraz liczba sesji od ostatniego szczytu - jeden przebieg."""
+    w = wealth.to_numpy(dtype=float)
+    peak = np.fmax.accumulate(w)
+    dd = np.divide(w - peak, peak, out=np.zeros(len(w)), where=peak > 0) * 100
+    pos = np.arange(len(w))
+    last_peak = np.maximum.accumulate(np.where(w >= peak, pos, 0))
+    return pd.DataFrame({'Obsuniecie_Proc': dd, 'Dni_Od_Szczytu': pos - last_peak}, index=wealth.index)
+
+
+def calculate_risk_metrics(equity, cost, bench_closes=None, window=ROLLING_WINDOW, risk_free=0.0):
+    """Analiza ryzyka portfela na krzywej kapitału i macierzy benchmarków (wektorowo, O(n)).
+    Zwraca słownik: summary (wskaźniki całego okresu), rolling (zmienność, Sharpe, Sortino w oknie),
+    drawdown (obsunięcie i jego czas trwania), benchmarks (beta i korelacja względem każdego benchmarku).
+    Wynik jest zapamiętywany per skrót danych wejściowych."""
+    if bench_closes is None:
+        bench_closes = pd.DataFrame()
+    key = digest(equity, cost, bench_closes, window, risk_free)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    rf = risk_free / TRADING_DAYS
+    r = flow_adjusted_returns(equity, cost)
+    active = r.notna()
+    excess = r - rf
+    downside = np.minimum(excess, 0.0) ** 2
+
+    # Indeks majątku (TWR) - obsunięcie liczone bez zniekształceń od kolejnych wpłat
+    wealth = (1 + r.fillna(0.0)).cumprod()
+    drawdown = drawdown_series(wealth)
+
+    roll = excess.rolling(window, min_periods=window)
+    roll_std = roll.std()
+    roll_down = np.sqrt(downside.rolling(window, min_periods=window).mean())
+    rolling = pd.DataFrame({
+        'Zmiennosc_Proc': roll_std * np.sqrt(TRADING_DAYS) * 100,
+        'Sharpe': roll.mean() / roll_std.replace(0, np.nan) * np.sqrt(TRADING_DAYS),
+        'Sortino': roll.mean() / roll_down.replace(0, np.nan) * np.sqrt(TRADING_DAYS),
+    })
+
+    mean, std = excess[active].mean(), excess[active].std()
+    down = np.sqrt(downside[active].mean())
+    summary = pd.Series({
+        'Zmiennosc_Proc': std * np.sqrt(TRADING_DAYS) * 100,
+        'Sharpe': mean / std * np.sqrt(TRADING_DAYS) if std > 0 else np.nan,
+        'Sortino': mean / down * np.sqrt(TRADING_DAYS) if down > 0 else np.nan,
+        'Max_DD_Proc': drawdown['Obsuniecie_Proc'].min(),
+        'Najdluzsze_DD_Dni': drawdown['Dni_Od_Szczytu'].max(),
+    })
+
+    benchmarks = pd.DataFrame(columns=['Beta', 'Korelacja'], dtype=float)
+    if not bench_closes.empty:
+        b = bench_closes.reindex(equity.index).ffill().pct_change(fill_method=None)
+        b = b[active.to_numpy()]
+        p = r[active]
+        # Kowariancje wszystkich kolumn naraz: E[(x - mx)(y - my)] na wspólnych obserwacjach
+        valid = b.notna().to_numpy() & p.notna().to_numpy()[:, None]
+        x = np.where(valid, b.to_numpy(dtype=float), 0.0)
+        y = np.where(valid, p.to_numpy(dtype=float)[:, None], 0.0)
+        n = valid.sum(axis=0).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mx, my = x.sum(axis=0) / n, y.sum(axis=0) / n
+            cov = (x * y).sum(axis=0) / n - mx * my
+            var_x = (x * x).sum(axis=0) / n - mx ** 2
+            var_y = (y * y).sum(axis=0) / n - my ** 2
+            benchmarks = pd.DataFrame({
+                'Beta': cov / var_x,
+                'Korelacja': cov / np.sqrt(var_x * var_y),
+            }, index=bench_closes.columns)
+
+    result = {'summary': summary, 'rolling': rolling, 'drawdown': drawdown, 'benchmarks': benchmarks}
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,22 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def digest(*parts):
+    """Skrót danych wejściowych (blake2b, 16 bajtów) - klucz pamięci podręcznych obliczeń i wykresów.
+    Ramki i serie hashowane są razem z indeksem (i nazwami kolumn), tablice numpy - z typem i kształtem,
+    pozostałe wartości przez repr."""
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        if isinstance(p, (pd.Series, pd.DataFrame)):
+            h.update(np.ascontiguousarray(pd.util.hash_pandas_object(p, index=True).to_numpy()).tobytes())
+            if isinstance(p, pd.DataFrame):
+                h.update(repr(list(p.columns)).encode())
+        elif isinstance(p, np.ndarray):
+            h.update(f"{p.dtype.str}{p.shape}".encode())
+            h.update(np.ascontiguousarray(p).tobytes())
+        else:
+            h.update(repr(p).encode())
+    return h.hexdigest()
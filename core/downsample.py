@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Poziomy piramidy: dzienny, tygodniowy, miesięczny (ostatnie notowanie okresu)
+PYRAMID_PERIODS = ('D', 'W', 'M')
+CHART_POINTS = 1000
+OVERSAMPLE = 4  # poziom piramidy może mieć do 4× więcej punktów niż cel - resztę robi LTTB
+
+
+def lttb_indices(x, y, n):
+    """Largest-Triangle-Three-Buckets: pozycje n punktów najlepiej zachowujących kształt serii.
+    Pierwszy i ostatni punkt zostają zawsze; średnie kubełków liczone są wektorowo."""
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    # n - 2 kubełków między pierwszym a ostatnim punktem; "następny" dla ostatniego to sam ostatni punkt
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    starts = np.append(edges[:-1], size - 1)
+    counts = np.diff(np.append(starts, size))
+    mean_x = np.add.reduceat(x, starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def build_pyramid(frame):
+    """Piramida rozdzielczości ramki (daty × serie): [(poziom, ramka)] od najdrobniejszego."""
+    # Zostawiamy rzeczywiste wiersze (z prawdziwymi datami), a nie etykiety okresów z resample
+    return [(p, frame[~frame.index.to_period(p).duplicated(keep='last')]) for p in PYRAMID_PERIODS]
+
+
+def downsample(pyramid, start=None, max_points=CHART_POINTS, anchor=None):
+    """Widoczny zakres (od start) zredukowany do max_points punktów.
+    Wybierany jest najdrobniejszy poziom piramidy mieszczący się w OVERSAMPLE × max_points,
+    a punkty wybiera LTTB na serii anchor (domyślnie suma kolumn) - wspólne dla wszystkich kolumn,
+    więc wykresy skumulowane pozostają spójne."""
+    visible = None
+    for _, level in pyramid:
+        visible = level.loc[pd.Timestamp(start):] if start is not None else level
+        if len(visible) <= max_points * OVERSAMPLE:
+            break
+    if len(visible) <= max_points:
+        return visible
+
+    y = visible[anchor] if anchor is not None else visible.sum(axis=1)
+    return visible.iloc[lttb_indices(visible.index.asi8, y.to_numpy(), max_points)]
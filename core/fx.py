@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Silnik kursów walut: kurs każdej waluty do PLN z pary bezpośredniej, odwrotnej albo krzyżowej (przez USD/EUR)
+BASE_CURRENCY = 'PLN'
+CROSS_VIA = ('USD', 'EUR')
+
+
+def pair_symbol(currency, quote=BASE_CURRENCY):
+    return f"{currency}{quote}=X"
+
+
+def _quote(rates, base, quote):
+    """Kurs base->quote ze słownika {para: kurs} (skalary lub tablice/serie) - wprost albo odwrotnie."""
+    if base == quote:
+        return 1.0
+    direct = rates.get(pair_symbol(base, quote))
+    if direct is None and base == 'USD':
+        direct = rates.get(f"{quote}=X")  # Yahoo: "JPY=X" to USD/JPY
+    if direct is not None:
+        return direct
+    inverse = rates.get(pair_symbol(quote, base))
+    if inverse is None and quote == 'USD':
+        inverse = rates.get(f"{base}=X")
+    if inverse is not None:
+        return 1.0 / inverse
+    return None
+
+
+def rate_to_base(currency, rates):
+    """Kurs waluty do PLN: para bezpośrednia/odwrotna, a gdy jej brak - kurs krzyżowy przez CROSS_VIA."""
+    rate = _quote(rates, currency, BASE_CURRENCY)
+    if rate is not None:
+        return rate
+    for via in CROSS_VIA:
+        if via == currency:
+            continue
+        leg, via_rate = _quote(rates, currency, via), _quote(rates, via, BASE_CURRENCY)
+        if leg is not None and via_rate is not None:
+            return leg * via_rate
+    return None
+
+
+def _rates(frame):
+    # Tylko kolumny wyglądające na pary walutowe Yahoo ("EURPLN=X", "JPY=X")
+    return {c: frame[c].to_numpy(dtype=float) for c in frame.columns
+            if isinstance(c, str) and c.endswith('=X') and len(c) in (5, 8)}
+
+
+def fx_matrix(hist_fx, currencies, index):
+    """Macierz dni × waluty z kursami do PLN wyrównanymi do index (ostatni znany kurs, na początku pierwszy).
+    Waluty, których nie da się wycenić, mają NaN."""
+    currencies = list(currencies)
+    out = np.full((len(index), len(currencies)), np.nan)
+    if not hist_fx.empty:
+        # Kursy z dni spoza index (np. piątek przed weekendem BTC) też trafiają do ffill
+        aligned = hist_fx.reindex(hist_fx.index.union(index)).ffill().reindex(index).bfill()
+        rates = _rates(aligned)
+    else:
+        rates = {}
+    for j, currency in enumerate(currencies):
+        rate = 1.0 if currency == BASE_CURRENCY else rate_to_base(currency, rates)
+        if rate is not None:
+            out[:, j] = rate
+    return pd.DataFrame(out, index=index, columns=currencies)
+
+
+def live_rates(currencies, quotes, hist_fx=None):
+    """Bieżące kursy do PLN: z notowań live, a gdy ich brak - ostatni kurs z historii.
+    Zwraca ({waluta: kurs}, [waluty bez kursu])."""
+    rates, missing = {BASE_CURRENCY: 1.0}, []
+    for currency in currencies:
+        if currency == BASE_CURRENCY:
+            continue
+        rate = rate_to_base(currency, quotes)
+        if rate is None and hist_fx is not None and not hist_fx.empty:
+            last = fx_matrix(hist_fx, [currency], hist_fx.index)[currency].dropna()
+            rate = last.iloc[-1] if not last.empty else None
+        if rate is None or not np.isfinite(rate):
+            missing.append(currency)
+        else:
+            rates[currency] = float(rate)
+    return rates, missing
+
+
+def cross_pairs(currencies, via=CROSS_VIA[0]):
+    """Pary potrzebne do kursu krzyżowego walut bez pary bezpośredniej: waluta/USD oraz USD/PLN."""
+    pairs = [pair_symbol(c, via) for c in currencies if c not in (via, BASE_CURRENCY)]
+    return pairs + [pair_symbol(via)] if pairs else []
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Schemat kolumn transakcji: typ i czy pusta komórka odrzuca wiersz (pusta liczba = 0, jak dotąd)
+SCHEMA = {
+    'Symbol': ('category', True),
+    'Waluta': ('category', True),
+    'Ilosc': ('number', False),
+    'Kwota_Poczatkowa_PLN': ('number', False),
+    'Data_Zakupu': ('date', True),
+}
+# Po ISO 8601 (także wartości datetime zapisane jako tekst) kolejno formaty wpisywane w arkuszu
+DATE_FORMATS = ('%d.%m.%Y', '%d/%m/%Y', '%Y.%m.%d')
+REJECTED_COLUMNS = ['Pozycja', 'Symbol', 'Data_Zakupu', 'Powod']
+
+
+def _text(col):
+    return col.astype(str).str.strip().mask(col.isna(), '')
+
+
+def _numbers(col):
+    # "1 234,5" -> 1234.5; liczby z arkusza (int/float) przechodzą bez zmian
+    text = _text(col).str.replace(r'\s', '', regex=True).str.replace(',', '.', regex=False)
+    blank = text == ''
+    values = pd.to_numeric(text.mask(blank), errors='coerce')
+    return values.fillna(0.0).astype(float), blank, values.isna() & ~blank
+
+
+def _dates(col):
+    text = _text(col)
+    blank = text == ''
+    values = pd.to_datetime(text.mask(blank), format='ISO8601', errors='coerce')
+    for fmt in DATE_FORMATS:
+        todo = values.isna() & ~blank
+        if not todo.any():
+            break
+        values = values.fillna(pd.to_datetime(text[todo], format=fmt, errors='coerce'))
+    return values.dt.normalize().astype('datetime64[ns]'), blank, values.isna() & ~blank
+
+
+def _categories(col):
+    text = _text(col)
+    blank = text == ''
+    return text.astype('category'), blank, pd.Series(False, index=col.index)
+
+
+PARSERS = {'number': _numbers, 'date': _dates, 'category': _categories}
+
+
+def parse_transactions(raw):
+    """Surowe wiersze arkusza -> (ramka transakcji, odrzucone wiersze).
+    Kolumny są parsowane w całości według SCHEMA. Wiersze z niepoprawną liczbą lub datą albo bez wymaganej
+    wartości trafiają do odrzuconych (Pozycja = numer wiersza użytkownika od 1) zamiast dostawać wartości zastępcze."""
+    df = pd.DataFrame(raw)
+    reasons = pd.Series('', index=df.index)
+    for column, (kind, required) in SCHEMA.items():
+        col = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        values, blank, bad = PARSERS[kind](col)
+        if required:
+            reasons = reasons.mask(blank, reasons + f"brak {column}; ")
+        reasons = reasons.mask(bad, reasons + column + ": '" + _text(col) + "'; ")
+        df[column] = values
+
+    rejected = (reasons != '').to_numpy()
+    report = pd.DataFrame({
+        'Pozycja': np.flatnonzero(rejected) + 1,
+        'Symbol': df['Symbol'].astype(object).to_numpy()[rejected],
+        'Data_Zakupu': [r.get('Data_Zakupu', '') for r, bad in zip(raw, rejected) if bad],
+        'Powod': reasons[rejected].str.rstrip('; ').to_numpy(),
+    }, columns=REJECTED_COLUMNS)
+
+    df = df[~rejected].reset_index(drop=True)
+    for column, (kind, _) in SCHEMA.items():
+        if kind == 'category':
+            df[column] = df[column].cat.remove_unused_categories()
+    return df, report
@@ -1,103 +1,138 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime, date
-
-
-def safe_float(val):
-    try:
-        if val is None: return 0.0
-        if isinstance(val, (int, float)): return float(val)
-        val = str(val).replace(',', '.').replace(' ', '').strip()
-        return float(val) if val != "" else 0.0
-    except:
-        return 0.0
-
-
-def safe_date(val):
-    try:
-        if isinstance(val, (datetime, date)): return val if isinstance(val, date) else val.date()
-        val = str(val).strip()
-        for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y.%m.%d'):
-            try:
-                return datetime.strptime(val, fmt).date()
-            except:
-                continue
-    except:
-        pass
-    return datetime.now().date()
-
-
-def calculate_portfolio_metrics(df, hist_prices, live_prices_map, live_fx_map):
-    df = df.copy()
-
-    def get_price(symbol):
-        price = live_prices_map.get(symbol, 0.0)
 
-        if price <= 0 and not hist_prices.empty and symbol in hist_prices.columns:
-            price = hist_prices[symbol].ffill().iloc[-1]
+from core.fx import fx_matrix
+from core.returns import group_xirr
 
-        return float(price) if pd.notna(price) else 0.0
 
-    df['Cena_Live'] = df['Symbol'].apply(get_price)
-    df['Kurs_Live'] = df['Waluta'].apply(lambda c: live_fx_map.get(c, 1.0))
+def last_valid_prices(hist_prices):
+    """Ostatnia znana cena każdego symbolu z historii (jeden przebieg po całej ramce)."""
+    if hist_prices.empty:
+        return pd.Series(dtype=float)
+    return hist_prices.ffill().iloc[-1]
 
-    df['Wartosc_PLN'] = df['Ilosc'] * df['Cena_Live'] * df['Kurs_Live']
 
-    df['Zysk_PLN'] = df.apply(
-        lambda r: r['Wartosc_PLN'] - r['Kwota_Poczatkowa_PLN'] if r['Cena_Live'] > 0 else 0.0,
-        axis=1
-    )
+def calculate_portfolio_metrics(df, hist_prices, live_prices_map, live_fx_map, as_of=None):
+    df = df.copy()
 
-    df['Zysk_Proc'] = df.apply(
-        lambda r: (r['Zysk_PLN'] / r['Kwota_Poczatkowa_PLN'] * 100)
-        if (r['Kwota_Poczatkowa_PLN'] > 0 and r['Cena_Live'] > 0) else 0.0,
-        axis=1
-    )
+    # Cena live, a gdy jej brak (lub <= 0) - ostatnia cena z historii
+    live = df['Symbol'].map(live_prices_map).astype(float).fillna(0.0)
+    hist = df['Symbol'].map(last_valid_prices(hist_prices)).astype(float)
+    df['Cena_Live'] = live.where(live > 0, hist).fillna(0.0)
+    # Waluta bez kursu zostaje bez wyceny (NaN) - nie przeliczamy jej po 1.0
+    df['Kurs_Live'] = df['Waluta'].map(live_fx_map).astype(float)
+
+    price = df['Cena_Live'].to_numpy(dtype=float)
+    cost = df['Kwota_Poczatkowa_PLN'].to_numpy(dtype=float)
+    value = df['Ilosc'].to_numpy(dtype=float) * price * df['Kurs_Live'].to_numpy(dtype=float)
+    profit = np.where(price > 0, value - cost, 0.0)
+
+    df['Wartosc_PLN'] = value
+    df['Zysk_PLN'] = profit
+    df['Zysk_Proc'] = np.divide(profit * 100, cost, out=np.zeros_like(profit), where=(cost > 0) & (price > 0))
+    # Zwrot roczny każdej transakcji (bez ceny - brak wyniku), wszystkie naraz jednym rozwiązaniem tablicowym
+    df['XIRR_Proc'] = group_xirr(cost, np.where(price > 0, value, np.nan), df['Data_Zakupu'],
+                                 np.arange(len(df)), as_of).to_numpy()
 
     return df
 
 
-def calculate_portfolio_history(df, hist_prices, hist_fx):
-    if hist_prices.empty: return pd.Series(), pd.Series(), {}
+def priced_lots(df, hist_prices, hist_fx):
+    """Transakcje, które da się wycenić w historii: symbol z notowaniami i waluta z kursem do PLN.
+    Zwraca (transakcje, kod waluty każdej z nich, macierz dni × waluty z fx_matrix)."""
+    lots = df[df['Symbol'].isin(hist_prices.columns)]
+    curr_codes, currencies = pd.factorize(lots['Waluta'])
+    fx = fx_matrix(hist_fx, currencies, hist_prices.index).to_numpy()
+    # Waluta bez kursu to NaN przez całą historię - takie pozycje nie wchodzą do sum zamiast liczyć się po 0
+    keep = ~np.isnan(fx).all(axis=0)[curr_codes]
+    return lots[keep], curr_codes[keep], fx
 
-    total_equity = pd.Series(0.0, index=hist_prices.index)
-    total_cost = pd.Series(0.0, index=hist_prices.index)
-    equity_map = {}
 
-    for _, row in df.iterrows():
-        symbol = row['Symbol']
-        currency = row['Waluta']
-        buy_date = pd.to_datetime(row['Data_Zakupu'])
+def build_position_matrix(df, hist_prices, hist_fx):
+    """Macierz dni × transakcje z wartością każdej pozycji w PLN (przed datą zakupu = 0).
+    Pozycje w walutach bez kursu są pomijane (patrz priced_lots)."""
+    index = hist_prices.index
+    lots, curr_codes, fx = priced_lots(df, hist_prices, hist_fx)
+    if lots.empty:
+        return np.zeros((len(index), 0)), np.zeros(0, dtype=int), lots
 
-        if symbol not in hist_prices.columns: continue
+    prices = hist_prices.ffill().bfill().to_numpy(dtype=float)
+    price_cols = hist_prices.columns.get_indexer(lots['Symbol'])
 
-        asset_prices = hist_prices[symbol].ffill().bfill()
+    starts = index.searchsorted(pd.to_datetime(lots['Data_Zakupu']).to_numpy())
+    active = np.arange(len(index))[:, None] >= starts[None, :]
 
-        fx_history = pd.Series(1.0, index=hist_prices.index)
-        if currency != 'PLN':
-            fx_col = f"{currency}PLN=X"
-            found_col = next((c for c in hist_fx.columns if fx_col in c or currency in c), None)
+    # Jedna kolumna kursu na walutę (silnik FX), rozgłaszana na wszystkie transakcje
+    values = prices[:, price_cols] * lots['Ilosc'].to_numpy(dtype=float) * fx[:, curr_codes]
+    values = np.nan_to_num(np.where(active, values, 0.0))
+    return values, starts, lots
 
-            if found_col:
-                fx_history = hist_fx[found_col].reindex(hist_prices.index).ffill().bfill()
-            else:
-                # Jeśli nadal nie mamy kursu, nie pozwólmy na 1.0 dla USD/EUR!
-                # Możesz tu dodać logikę pobierania awaryjnego lub st.warning
-                pass
 
-        pos_val = (asset_prices * row['Ilosc'] * fx_history)
-        pos_cost = pd.Series(0.0, index=hist_prices.index)
+def calculate_portfolio_history(df, hist_prices, hist_fx):
+    if hist_prices.empty: return pd.Series(), pd.Series(), {}
+
+    index = hist_prices.index
+    values, starts, lots = build_position_matrix(df, hist_prices, hist_fx)
+    if lots.empty:
+        return pd.Series(0.0, index=index), pd.Series(0.0, index=index), {}
 
-        mask = pos_val.index >= buy_date
-        pos_cost[mask] = row['Kwota_Poczatkowa_PLN']
-        pos_val[~mask] = 0
+    total_equity = pd.Series(values.sum(axis=1), index=index)
 
-        total_equity = total_equity.add(pos_val, fill_value=0)
-        total_cost = total_cost.add(pos_cost, fill_value=0)
+    # Koszt wchodzi w dniu zakupu i zostaje do końca: suma narastająca po indeksach startu
+    amounts = np.nan_to_num(lots['Kwota_Poczatkowa_PLN'].to_numpy(dtype=float))
+    cost = np.bincount(starts, weights=amounts, minlength=len(index) + 1)[:len(index)].cumsum()
+    total_cost = pd.Series(cost, index=index)
 
-        equity_map[symbol] = equity_map.get(symbol, pd.Series(0.0, index=hist_prices.index)).add(pos_val, fill_value=0)
+    sym_codes, symbols = pd.factorize(lots['Symbol'])
+    order = np.argsort(sym_codes, kind='stable')
+    bounds = np.searchsorted(sym_codes[order], np.arange(len(symbols)))
+    per_symbol = np.add.reduceat(values[:, order], bounds, axis=1)
+    equity_map = {s: pd.Series(per_symbol[:, i], index=index) for i, s in enumerate(symbols)}
 
     return total_equity, total_cost, equity_map
 
+
+def calculate_benchmark_roi(bench_closes, equity_index, first_trade_date):
+    """ROI (%) wszystkich benchmarków naraz: wyrównanie do indeksu krzywej kapitału
+    i przeskalowanie do dnia pierwszej transakcji (wcześniej 0). Kolumna na benchmark."""
+    aligned = bench_closes.reindex(equity_index).ffill().bfill().dropna(axis=1, how='all')
+    if aligned.columns.empty:
+        return pd.DataFrame(index=equity_index)
+
+    start = min(equity_index.searchsorted(first_trade_date), len(equity_index) - 1)
+    values = aligned.to_numpy(dtype=float)
+    roi = (values / values[start] - 1) * 100
+    roi[:start + 1] = 0.0
+    return pd.DataFrame(roi, index=equity_index, columns=aligned.columns)
+
+
+def calculate_roi(equity, cost):
+    """ROI (%) krzywej kapitału względem zainwestowanej kwoty (0 przed pierwszą wpłatą) i dzień pierwszej transakcji."""
+    first_trade_mask = cost > 0
+    if first_trade_mask.any():
+        first_trade_date = cost[first_trade_mask].index[0]
+    else:
+        first_trade_date = equity.index[0]
+
+    roi = pd.Series(0.0, index=equity.index)
+    roi[first_trade_mask] = ((equity[first_trade_mask] / cost[first_trade_mask]) - 1) * 100
+    return roi, first_trade_date
+
+
+def patch_live_point(equity, cost, live_value, live_cost, now):
+    """Krzywa kapitału z dzisiejszym punktem z notowań live: ostatni punkt jest zastępowany,
+    a w dzień roboczy późniejszy niż historia - dopisywany."""
+    today = pd.Timestamp(now).normalize()
+    equity, cost = equity.copy(), cost.copy()
+    if equity.index[-1] < today and today.weekday() < 5:
+        equity.loc[today] = live_value
+        cost.loc[today] = live_cost
+    else:
+        equity.iloc[-1] = live_value
+        cost.iloc[-1] = live_cost
+    return equity, cost
+
+
 def clean_timezone(df):
     if isinstance(df.index, pd.DatetimeIndex):
         df.index = df.index.tz_localize(None)
@@ -1,29 +1,179 @@
-import pandas as pd
+from collections import Counter
+
 import numpy as np
+import pandas as pd
+
+from core.analytics import calculate_risk_metrics
+from core.digest import digest
+from core.fx import fx_matrix
+from core.returns import time_weighted_return
+from core.metrics import build_position_matrix, calculate_portfolio_history, \
+    calculate_portfolio_metrics, calculate_benchmark_roi, calculate_roi, last_valid_prices, priced_lots
+
+__all__ = ['build_position_matrix', 'calculate_portfolio_history', 'IncrementalHistory', 'compute_portfolio',
+           'history_start']
+
+MIN_HISTORY_DAYS = 30
+SHORT_HISTORY_DAYS = 365
+
+
+def _lot_key(row):
+    return (row['Symbol'], float(row['Ilosc']), pd.Timestamp(row['Data_Zakupu']), row['Waluta'],
+            float(row['Kwota_Poczatkowa_PLN']))
+
+
+def history_start(start_date, now=None):
+    """Początek historii notowań portfela: dzień pierwszej transakcji, a dla portfeli młodszych niż
+    MIN_HISTORY_DAYS - rok wstecz (wykresy i benchmarki mają wtedy z czym porównać)."""
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    start = pd.Timestamp(start_date)
+    if (now - start).days < MIN_HISTORY_DAYS:
+        start = now - pd.Timedelta(days=SHORT_HISTORY_DAYS)
+    return start.normalize()
+
+
+def _owner_frame(frame, columns, start):
+    return frame[[c for c in columns if c in frame.columns]].loc[start:].dropna(how='all')
+
+
+def compute_portfolio(df, hist_prices, hist_fx, hist_bench, live_prices, live_fx):
+    """Pełny wynik jednego portfela na wspólnych (szerszych) ramkach notowań - bez stanu sesji.
+    Ramki są zawężane do symboli, walut i okresu portfela (history_start), tak jak w load_market_data
+    dla jednego użytkownika."""
+    start = history_start(df['Data_Zakupu'].min())
+    hist_p = _owner_frame(hist_prices, df['Symbol'].unique(), start)
+    # Kursy bez zawężania do par "XXXPLN=X" - silnik FX może potrzebować par krzyżowych
+    hist_f = hist_fx.loc[start:].dropna(how='all')
+    hist_b = hist_bench.loc[start:].dropna(how='all')
+
+    metrics = calculate_portfolio_metrics(df, hist_p, live_prices, live_fx)
+    equity, cost, equity_map = calculate_portfolio_history(df, hist_p, hist_f)
+    result = {'metrics': metrics, 'equity': equity, 'cost': cost, 'equity_map': equity_map,
+              'last_prices': last_valid_prices(hist_p), 'roi': None, 'twr': None, 'bench_roi': None, 'risk': None}
+    if len(equity) > 1:
+        result['roi'], first_trade_date = calculate_roi(equity, cost)
+        result['twr'] = time_weighted_return(equity, cost)
+        result['bench_roi'] = calculate_benchmark_roi(hist_b, equity.index, first_trade_date)
+        result['risk'] = calculate_risk_metrics(equity, cost, hist_b)
+    return result
+
+
+class IncrementalHistory:
+    """Krzywa kapitału utrzymywana przyrostowo: wkład każdej transakcji jest zapamiętany,
+    więc dodanie lub usunięcie jednej pozycji kosztuje O(dni), a nie O(pozycje × dni).
+    Wkłady przeliczane są od nowa tylko dla symboli/walut, których notowania się zmieniły."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.index = None
+        self.index_digest = None
+        self.price_digests = {}
+        self.fx_digests = {}
+        self.contributions = {}   # klucz transakcji -> (wartości w PLN, indeks dnia zakupu, koszt)
+        self.counts = Counter()
+        self.total_equity = None
+        self.total_cost = None
+        self.per_symbol = {}
+        self.dirty = set()        # symbole, z których usunięto pozycje - do przeliczenia w _settle
+
+    def _fingerprints(self, hist_prices, hist_fx, symbols, currencies):
+        prices = {s: digest(hist_prices[s].to_numpy(dtype=float)) for s in symbols}
+        # Skrót kursu do PLN, który faktycznie trafia do wyceny (także krzyżowego)
+        rates = fx_matrix(hist_fx, currencies, hist_prices.index)
+        fx = {c: digest(rates[c].to_numpy(dtype=float)) for c in currencies}
+        return prices, fx
+
+    def _apply(self, key):
+        values, start, amount = self.contributions[key]
+        symbol = key[0]
+        self.total_equity += values
+        self.total_cost[start:] += amount
+        self.per_symbol[symbol] = self.per_symbol.get(symbol, 0.0) + values
+
+    def _remove(self, key, n):
+        self.counts[key] -= n
+        self.dirty.add(key[0])
+        if self.counts[key] <= 0:
+            del self.counts[key], self.contributions[key]
+
+    def _settle(self):
+        """Po usunięciu pozycji sumy są składane od nowa z pozostałych wkładów (tylko symbole, których to dotyczy).
+        Odejmowanie zostawiałoby resztki zmiennoprzecinkowe - np. koszt 1e-17 przed pierwszym zakupem,
+        który calculate_roi uznałby za zainwestowany kapitał."""
+        if not self.dirty:
+            return
+        by_symbol = {}
+        for key, count in self.counts.items():
+            if key[0] in self.dirty:
+                by_symbol.setdefault(key[0], []).append((self.contributions[key][0], count))
+        for symbol in self.dirty:
+            if symbol in by_symbol:
+                self.per_symbol[symbol] = sum(values * count for values, count in by_symbol[symbol])
+            else:
+                self.per_symbol.pop(symbol, None)
+        self.dirty.clear()
+
+        self.total_equity = np.zeros(len(self.index))
+        for values in self.per_symbol.values():
+            self.total_equity += values
+        starts = [self.contributions[key][1] for key in self.counts]
+        amounts = [self.contributions[key][2] * count for key, count in self.counts.items()]
+        self.total_cost = np.bincount(np.asarray(starts, dtype=int), weights=amounts,
+                                      minlength=len(self.index) + 1)[:len(self.index)].cumsum()
+
+    def update(self, df, hist_prices, hist_fx):
+        """Ten sam kontrakt co calculate_portfolio_history: (total_equity, total_cost, equity_map)."""
+        if hist_prices.empty:
+            self.reset()
+            return pd.Series(), pd.Series(), {}
+
+        index = hist_prices.index
+        index_digest = digest(index.asi8)
+        if index_digest != self.index_digest:
+            self.reset()
+            self.index, self.index_digest = index, index_digest
+            self.total_equity = np.zeros(len(index))
+            self.total_cost = np.zeros(len(index))
 
-def calculate_portfolio_history(df, hist_prices, hist_fx):
-    if hist_prices.empty: return pd.Series(), pd.Series(), {}
-    total_equity = pd.Series(0.0, index=hist_prices.index)
-    total_cost = pd.Series(0.0, index=hist_prices.index)
-    equity_dict = {}
+        lots, _, _ = priced_lots(df, hist_prices, hist_fx)
+        prices, fx = self._fingerprints(hist_prices, hist_fx, lots['Symbol'].unique(), lots['Waluta'].unique())
 
-    for _, row in df.iterrows():
-        symbol, currency, buy_date = row['Symbol'], row['Waluta'], pd.to_datetime(row['Data_Zakupu'])
-        if symbol not in hist_prices.columns: continue
+        # Zmienione notowania symbolu lub kursu waluty unieważniają wkłady zależnych transakcji
+        changed_symbols = {s for s, d in prices.items() if self.price_digests.get(s, d) != d}
+        changed_fx = {c for c, d in fx.items() if self.fx_digests.get(c, d) != d}
+        for key in list(self.contributions):
+            if key[0] in changed_symbols or key[3] in changed_fx:
+                self._remove(key, self.counts[key])
+        self.price_digests.update(prices)
+        self.fx_digests.update(fx)
 
-        fx_history = 1.0
-        if currency != 'PLN':
-            fx_col = f"{currency}PLN=X"
-            if fx_col in hist_fx.columns: fx_history = hist_fx[fx_col].reindex(hist_prices.index).ffill().bfill()
+        keys = [_lot_key(r) for r in lots.to_dict('records')]
+        wanted = Counter(keys)
+        for key in list(self.counts):
+            if self.counts[key] > wanted[key]:
+                self._remove(key, self.counts[key] - wanted[key])
+        self._settle()
 
-        pos_value = (hist_prices[symbol] * row['Ilosc'] * fx_history)
-        pos_cost = pd.Series(0.0, index=hist_prices.index)
-        mask = pos_cost.index >= buy_date
-        pos_cost[mask] = row['Kwota_Poczatkowa_PLN']
-        pos_value[~mask] = 0
+        added, pending = [], Counter()
+        for i, key in enumerate(keys):
+            if self.counts[key] + pending[key] < wanted[key]:
+                pending[key] += 1
+                added.append(i)
 
-        total_equity += pos_value
-        total_cost += pos_cost
-        equity_dict[symbol] = equity_dict.get(symbol, 0) + pos_value
+        if added:
+            new_lots = lots.iloc[added]
+            values, starts, _ = build_position_matrix(new_lots, hist_prices, hist_fx)
+            amounts = np.nan_to_num(new_lots['Kwota_Poczatkowa_PLN'].to_numpy(dtype=float))
+            for j, i in enumerate(added):
+                key = keys[i]
+                if key not in self.contributions:
+                    self.contributions[key] = (values[:, j].copy(), starts[j], amounts[j])
+                self.counts[key] += 1
+                self._apply(key)
 
-    return total_equity, total_cost, equity_dict
\ No newline at end of file
+        total_equity = pd.Series(self.total_equity.copy(), index=index)
+        total_cost = pd.Series(self.total_cost.copy(), index=index)
+        equity_map = {s: pd.Series(self.per_symbol[s].copy(), index=index) for s in pd.unique(lots['Symbol'])}
+        return total_equity, total_cost, equity_map
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from core.analytics import flow_adjusted_returns
+
+# Stopy zwrotu: ważona czasem (TWR, z krzywej kapitału) i ważona kapitałem (XIRR, z przepływów transakcji)
+DAYS_PER_YEAR = 365.0
+MIN_XIRR_DAYS = 365  # krótszych okresów nie annualizujemy - zwrot z kilku tygodni podniesiony do potęgi jest bez sensu
+XIRR_TOL = 1e-9
+XIRR_MAX_ITER = 100
+
+
+def time_weighted_return(equity, cost):
+    """Skumulowana stopa zwrotu ważona czasem (%): iloczyn dziennych stóp bez wpływu wpłat.
+    Porównywalna z benchmarkami niezależnie od tego, kiedy i ile dopłacano (0 przed pierwszą transakcją)."""
+    r = flow_adjusted_returns(equity, cost).fillna(0.0)
+    return ((1 + r).cumprod() - 1) * 100
+
+
+def xirr(amounts, years, groups, n_groups):
+    """Roczne stopy r zerujące wartość przepływów każdej grupy na dzień wyceny: sum(amounts * (1+r)**years) = 0,
+    gdzie years to lata od przepływu do wyceny (wpłaty ujemne, wycena dodatnia z years = 0).
+    Wszystkie grupy liczone są naraz: Newton w przedziale [lo, hi] każdej grupy, a krok wychodzący
+    poza przedział zastępuje bisekcja. Grupy bez rozwiązania (brak wpłat lub wyceny) mają NaN."""
+    amounts, years = np.asarray(amounts, dtype=float), np.asarray(years, dtype=float)
+    groups = np.asarray(groups, dtype=np.intp)
+
+    def npv(rate):
+        growth = (1 + rate[groups]) ** years
+        f = np.bincount(groups, amounts * growth, n_groups)
+        fp = np.bincount(groups, amounts * years * growth / (1 + rate[groups]), n_groups)
+        return f, fp
+
+    paid = np.bincount(groups, np.where(amounts < 0, -amounts, 0.0), n_groups)
+    value = np.bincount(groups, np.where(amounts > 0, amounts, 0.0), n_groups)
+    valid = (paid > 0) & (value > 0) & np.isfinite(paid) & np.isfinite(value)
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        # Same zakupy przed wyceną: wartość maleje z r, więc pierwiastek jest w (-1, hi) - hi rośnie do zmiany znaku
+        lo = np.full(n_groups, -1 + 1e-9)
+        hi = np.ones(n_groups)
+        for _ in range(60):
+            f, _ = npv(hi)
+            grow = valid & (f > 0)
+            if not grow.any():
+                break
+            hi[grow] *= 4
+
+        # Start: stopa prosta zannualizowana po średnim (ważonym kwotą) czasie trwania
+        duration = np.bincount(groups, np.where(amounts < 0, -amounts * years, 0.0), n_groups) / np.where(paid > 0, paid, 1)
+        rate = np.where(valid, (value / np.where(paid > 0, paid, 1)) ** (1 / np.maximum(duration, 1e-6)) - 1, 0.0)
+        rate = np.clip(np.nan_to_num(rate), lo, hi)
+
+        for _ in range(XIRR_MAX_ITER):
+            f, fp = npv(rate)
+            lo = np.where(f > 0, rate, lo)
+            hi = np.where(f < 0, rate, hi)
+            step = rate - f / fp
+            bisect = ~np.isfinite(step) | (step <= lo) | (step >= hi)
+            new = np.where(bisect, (lo + hi) / 2, step)
+            done = np.abs(new - rate) <= XIRR_TOL * (1 + np.abs(rate))
+            rate = new
+            if done[valid].all():
+                break
+
+    return np.where(valid, rate, np.nan)
+
+
+def group_xirr(cost, value, bought, groups, as_of=None):
+    """XIRR (% rocznie) grup transakcji: zakupy za cost w dniach bought i łączna wartość value na dzień as_of.
+    groups - etykieta grupy każdej transakcji (np. indeks wiersza, symbol, jedna stała dla portfela).
+    Transakcja bez wyceny (NaN) unieważnia swoją grupę; okresy krótsze niż MIN_XIRR_DAYS mają NaN."""
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.now()).normalize()
+    codes, labels = pd.factorize(pd.Series(groups).to_numpy(), use_na_sentinel=False)
+    n = len(labels)
+    cost = np.asarray(cost, dtype=float)
+    value = np.asarray(value, dtype=float)
+    days = (as_of - pd.to_datetime(np.asarray(bought))).days.to_numpy(dtype=float)
+
+    broken = np.bincount(codes, ~np.isfinite(value) | ~np.isfinite(cost) | (days < 0), n) > 0
+    longest = np.full(n, -np.inf)
+    np.maximum.at(longest, codes, days)
+
+    # Przepływy: wpłaty (ujemne, lata do wyceny) i jedna wycena grupy na dzień as_of
+    amounts = np.concatenate([-np.nan_to_num(cost), np.bincount(codes, np.nan_to_num(value), n)])
+    years = np.concatenate([np.maximum(days, 0) / DAYS_PER_YEAR, np.zeros(n)])
+    rates = xirr(amounts, years, np.concatenate([codes, np.arange(n)]), n) * 100
+    rates[broken | (longest < MIN_XIRR_DAYS)] = np.nan
+    return pd.Series(rates, index=labels)
@@ -0,0 +1,84 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Pomiary etapów jednego przebiegu skryptu: czas, trafienia cache, liczba wierszy, rozmiar danych.
+# Każdy etap to jedna linia JSON w loggerze "suitsy.timing" - do agregacji percentyli poza aplikacją.
+LOGGER_NAME = "suitsy.timing"
+logger = logging.getLogger(LOGGER_NAME)
+_local = threading.local()
+
+
+class RunTimer:
+    """Etapy jednego przebiegu. counters - funkcja zwracająca {'hits', 'misses'} pamięci podręcznej
+    liczone dla wątku przebiegu (nie całego procesu); różnica przed/po etapie trafia do rekordu
+    jako cache_hits / cache_misses."""
+
+    def __init__(self, counters=None, **context):
+        self.id = uuid.uuid4().hex[:12]
+        self.context = context
+        self.counters = counters
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Mierzy blok kodu; zwracany słownik można uzupełnić (rows, bytes, cache_hits...) w trakcie."""
+        record = dict(stage=name, **info)
+        before = self.counters() if self.counters else None
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = round((time.perf_counter() - start) * 1000, 2)
+            if before is not None:
+                after = self.counters()
+                hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+                if hits or misses:
+                    record.setdefault('cache_hits', hits)
+                    record.setdefault('cache_misses', misses)
+            self.stages.append(record)
+            logger.info(json.dumps(dict(run=self.id, **self.context, **record), default=str, ensure_ascii=False))
+
+
+def start_run(counters=None, **context):
+    """Nowy przebieg staje się bieżącym dla wątku - stage() w dowolnym module zapisuje do niego."""
+    _local.run = RunTimer(counters, **context)
+    return _local.run
+
+
+def current_run():
+    return getattr(_local, 'run', None)
+
+
+@contextmanager
+def stage(name, **info):
+    """Etap bieżącego przebiegu; bez aktywnego przebiegu tylko wykonuje blok."""
+    run = current_run()
+    if run is None:
+        yield dict(stage=name, **info)
+        return
+    with run.stage(name, **info) as record:
+        yield record
+
+
+def configure_logging(level=logging.INFO):
+    """Surowe linie JSON na stderr (jedna na etap), jeśli logger nie ma jeszcze handlera."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+def frame_bytes(*frames):
+    """Rozmiar ramek/serii w pamięci (bajty) - miara ilości danych przetworzonych w etapie."""
+    return int(sum(f.memory_usage(deep=False).sum() if hasattr(f, 'columns') else f.memory_usage(deep=False)
+                   for f in frames))
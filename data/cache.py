@@ -0,0 +1,74 @@
+import threading
+import time
+import streamlit as st
+
+# Zakresy pamięci podręcznej i czas życia wpisów (s)
+SCOPE_TTL = {
+    'live': 300,          # bieżące notowania (instrumenty i pary walutowe)
+    'history': 3600,      # historia cen pozycji, per ticker
+    'fx': 3600,           # historia kursów walut, per para
+    'benchmarks': 3600,   # historia benchmarków, per symbol
+}
+
+
+class ScopedCache:
+    """Wspólna dla procesu pamięć podręczna z nazwanymi zakresami.
+    Wpisy są kluczowane symbolem, więc unieważniać można pojedyncze tickery w jednym zakresie."""
+
+    def __init__(self, scope_ttl=SCOPE_TTL):
+        self.scope_ttl = dict(scope_ttl)
+        self.lock = threading.Lock()
+        self.entries = {scope: {} for scope in self.scope_ttl}
+        self.counters = {scope: {'hits': 0, 'misses': 0, 'invalidated': 0} for scope in self.scope_ttl}
+        self.local = threading.local()   # trafienia/chybienia wątku - przebieg skryptu jednej sesji
+
+    def get(self, scope, key):
+        """Zwraca (trafienie, wartość)."""
+        with self.lock:
+            entry = self.entries[scope].get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.counters[scope]['hits'] += 1
+                self._thread_counts()['hits'] += 1
+                return True, entry[1]
+            self.entries[scope].pop(key, None)
+            self.counters[scope]['misses'] += 1
+            self._thread_counts()['misses'] += 1
+            return False, None
+
+    def put(self, scope, key, value):
+        with self.lock:
+            self.entries[scope][key] = (time.monotonic() + self.scope_ttl[scope], value)
+
+    def invalidate(self, scope, keys=None):
+        """Usuwa wpisy zakresu - wszystkie albo tylko podane klucze."""
+        with self.lock:
+            entries = self.entries[scope]
+            targets = list(entries) if keys is None else [k for k in keys if k in entries]
+            for k in targets:
+                del entries[k]
+            self.counters[scope]['invalidated'] += len(targets)
+            return len(targets)
+
+    def _thread_counts(self):
+        counts = getattr(self.local, 'counts', None)
+        if counts is None:
+            counts = self.local.counts = {'hits': 0, 'misses': 0}
+        return counts
+
+    def totals(self):
+        """Trafienia i chybienia we wszystkich zakresach, ale tylko z bieżącego wątku (do pomiarów etapów) -
+        równoległe sesje nie zawyżają sobie nawzajem liczników."""
+        return dict(self._thread_counts())
+
+    def stats(self):
+        """Liczniki per zakres (trafienia, chybienia, unieważnienia) i liczba wpisów - do panelu diagnostycznego."""
+        with self.lock:
+            return {
+                scope: dict(self.counters[scope], entries=len(self.entries[scope]))
+                for scope in self.scope_ttl
+            }
+
+
+@st.cache_resource
+def get_cache():
+    return ScopedCache()
@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Pobieranie paczkami: ograniczona pula wątków, wspólny limit zapytań, ponowienia z wykładniczym
+# opóźnieniem i losowym rozrzutem. Udane paczki są zachowywane, nawet gdy inne się nie powiodą.
+CHUNK_SIZE = 20
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 2.0
+BURST = 5
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5   # s
+BACKOFF_MAX = 8.0    # s
+
+
+class RateLimiter:
+    """Wspólny dla wszystkich wątków limit zapytań (kubełek żetonów): do burst zapytań od razu,
+    potem nie częściej niż rate na sekundę."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate, self.burst = rate, burst
+        self.clock, self.sleep = clock, sleep
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def wait(self):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Żeton rezerwujemy od razu - ujemny stan to kolejka oczekujących wątków
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            self.sleep(delay)
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Opóźnienie przed ponowieniem nr attempt (od 0): wykładnicze, z rozrzutem 50-100%,
+    żeby równoległe wątki nie ponawiały zapytań w tej samej chwili."""
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class FetchResult:
+    """Wyniki udanych paczek i symbole, których nie udało się pobrać (z ostatnim błędem)."""
+
+    def __init__(self):
+        self.parts = []
+        self.errors = {}    # symbol -> komunikat błędu (wyjątek dostawcy)
+        self.missing = []   # symbole bez danych w odpowiedzi (po ponowieniu pojedynczo)
+
+
+class FetchExecutor:
+    """Wykonawca pobrań wspólny dla sesji: dzieli symbole na paczki i scala częściowe sukcesy.
+    Jedna pula wątków na wykonawcę - równoległe sesje dzielą max_workers wątków, a nie tworzą własnych."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_workers=MAX_WORKERS, rate=REQUESTS_PER_SECOND,
+                 attempts=MAX_ATTEMPTS, sleep=time.sleep):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.attempts = attempts
+        self.sleep = sleep
+        self.limiter = RateLimiter(rate, sleep=sleep)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="suitsy-fetch")
+
+    def _call(self, fn, chunk, attempts):
+        for attempt in range(attempts):
+            self.limiter.wait()
+            try:
+                return fn(chunk)
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                self.sleep(backoff_delay(attempt))
+
+    def _round(self, fn, chunks, attempts):
+        futures = [(chunk, self.pool.submit(self._call, fn, chunk, attempts)) for chunk in chunks]
+        out = []
+        for chunk, future in futures:
+            try:
+                out.append((chunk, future.result(), None))
+            except Exception as e:
+                out.append((chunk, None, e))
+        return out
+
+    def run(self, fn, symbols, missing=None):
+        """fn(paczka symboli) -> wynik. missing(paczka, wynik) -> symbole bez danych w wyniku.
+        Paczki, które zawiodły mimo ponowień, oraz symbole bez danych są pobierane jeszcze raz pojedynczo -
+        jeden problematyczny ticker nie przekreśla całej paczki."""
+        result = FetchResult()
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return result
+
+        chunks = [symbols[i:i + self.chunk_size] for i in range(0, len(symbols), self.chunk_size)]
+        retry = []
+        for chunk, value, error in self._round(fn, chunks, self.attempts):
+            if error is not None:
+                if len(chunk) == 1:
+                    result.errors[chunk[0]] = str(error)
+                else:
+                    retry += chunk
+                continue
+            result.parts.append(value)
+            lost = missing(chunk, value) if missing else []
+            retry += [s for s in lost if len(chunk) > 1]
+            result.missing += [s for s in lost if len(chunk) == 1]
+
+        if retry:
+            # Pojedynczo, jedna próba - pełne ponowienia paczki już się odbyły
+            for chunk, value, error in self._round(fn, [[s] for s in retry], 1):
+                if error is not None:
+                    result.errors[chunk[0]] = str(error)
+                elif missing and missing(chunk, value):
+                    result.missing.append(chunk[0])
+                else:
+                    result.parts.append(value)
+        return result
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datetime import timedelta
+from core.fx import BASE_CURRENCY, cross_pairs, live_rates, pair_symbol
+from data.providers import get_provider
+
+# Sufiksy giełd wpisywane przez użytkowników -> sufiksy Yahoo
+SUFFIX_MAP = {'.PL': '.WA'}
+INSTRUMENT_TTL = 24 * 3600
+TRADE_WINDOW_DAYS = 5
+
+
+def normalize_symbol(ticker):
+    ticker = ticker.upper().strip()
+    for suffix, target in SUFFIX_MAP.items():
+        if ticker.endswith(suffix):
+            return ticker[:-len(suffix)] + target
+    return ticker
+
+
+@st.cache_data(ttl=INSTRUMENT_TTL, show_spinner=False)
+def _instrument_metadata(symbol):
+    # Wyjątki (np. brak sieci) nie trafiają do cache - zapamiętujemy tylko odpowiedzi dostawcy
+    return get_provider().metadata(symbol)
+
+
+def resolve_instrument(ticker):
+    """Rejestr instrumentów: (symbol, waluta notowań, błąd). Odpowiedź - także negatywna - trzymana przez dobę."""
+    symbol = normalize_symbol(ticker)
+    try:
+        info = _instrument_metadata(symbol)
+    except Exception as e:
+        return None, None, f"Błąd walidacji: {str(e)}"
+    if not info or not info.get('currency'):
+        return None, None, f"Symbol {symbol} nieznany lub brak danych"
+    return symbol, info['currency'].upper(), None
+
+
+def _closest(series, day):
+    series = series.dropna()
+    if series.empty:
+        return None, None
+    pos = int(np.abs((series.index - pd.Timestamp(day)).days).argmin())
+    return series.index[pos].date(), float(series.iloc[pos])
+
+
+def get_trade_quote(symbol, trade_date, currencies):
+    """Cena instrumentu i kursy walut do PLN z dnia transakcji (lub najbliższego notowania) - jedno zapytanie.
+    Kursy z silnika FX: para bezpośrednia, a gdy jej brak - kurs krzyżowy przez USD (pary pobierane od razu).
+    Zwraca (data ceny, cena, {waluta: kurs}); data i cena to None, gdy brak notowań w oknie,
+    a waluty bez kursu są pominięte."""
+    foreign = [c for c in currencies if c != BASE_CURRENCY]
+    pairs = list(dict.fromkeys([pair_symbol(c) for c in foreign] + cross_pairs(foreign)))
+    hist = get_provider().history(
+        [symbol] + pairs,
+        trade_date - timedelta(days=TRADE_WINDOW_DAYS),
+        trade_date + timedelta(days=TRADE_WINDOW_DAYS)
+    )
+
+    price_date, price = _closest(hist[symbol], trade_date) if symbol in hist.columns else (None, None)
+    quotes = {}
+    for pair in pairs:
+        rate = _closest(hist[pair], trade_date)[1] if pair in hist.columns else None
+        # Kolumna bez notowań (częściowe pobranie) - waluta bez kursu zamiast None w słowniku
+        if rate is not None:
+            quotes[pair] = rate
+    rates, _ = live_rates(currencies, quotes)
+    return price_date, price, rates
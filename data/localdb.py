@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+
+import streamlit as st
+
+from core.timing import stage
+from data.storage import (ID_COL, OWNER_COL, VERSION_COL, ConflictError, check_version, new_transaction_id, owner_key,
+                          plain_value, same_value)
+
+# Lokalna baza transakcji (SUITSY_STORAGE=sqlite): indeks po właścicielu, zapis pojedynczych transakcji,
+# bez sieci i poświadczeń Google. Kolumny transakcji trzymane są jako JSON - jak wiersz arkusza.
+DB_PATH = os.environ.get(
+    "SUITSY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "suitsy.sqlite")
+)
+KEY_COLUMNS = (ID_COL, VERSION_COL)
+
+
+def _payload(record):
+    return json.dumps({c: plain_value(v) for c, v in record.items() if c not in KEY_COLUMNS}, ensure_ascii=False)
+
+
+class TransactionDB:
+    """Transakcje w SQLite. Każda zmiana podbija wspólną wersję bazy (odpowiednik daty modyfikacji arkusza)."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS transactions ("
+                "seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, owner TEXT NOT NULL, "
+                "version INTEGER NOT NULL, data TEXT NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS transactions_owner ON transactions (owner, seq)")
+            con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            con.execute("INSERT OR IGNORE INTO meta VALUES ('revision', 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        # Blokada zapisu od początku - sprawdzenie wersji i zmiana są atomowe względem innych procesów
+        with closing(self._connect()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _bump(con):
+        con.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    @staticmethod
+    def _record(tx_id, version, data):
+        return dict(json.loads(data), **{ID_COL: tx_id, VERSION_COL: version})
+
+    @contextmanager
+    def _snapshot(self):
+        # Jedna transakcja odczytu - wersja bazy i wiersze pochodzą z tego samego stanu (WAL)
+        with closing(self._connect()) as con:
+            con.execute("BEGIN")
+            try:
+                yield con, con.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+            finally:
+                con.execute("COMMIT")
+
+    def records(self, username):
+        """(wersja bazy, transakcje użytkownika)."""
+        with self._snapshot() as (con, revision):
+            rows = con.execute("SELECT id, version, data FROM transactions WHERE owner = ? ORDER BY seq",
+                               (owner_key(username),))
+            return revision, [self._record(*r) for r in rows]
+
+    def owners(self):
+        """(wersja bazy, {klucz właściciela: transakcje})."""
+        with self._snapshot() as (con, revision):
+            out = {}
+            for owner, *r in con.execute("SELECT owner, id, version, data FROM transactions ORDER BY seq"):
+                out.setdefault(owner, []).append(self._record(*r))
+            return revision, out
+
+    def _insert(self, con, username, records):
+        for r in records:
+            r[ID_COL] = r.get(ID_COL) or new_transaction_id()
+            r[VERSION_COL] = 1
+            r[OWNER_COL] = username
+        con.executemany("INSERT INTO transactions (id, owner, version, data) VALUES (?, ?, 1, ?)",
+                        [(r[ID_COL], owner_key(username), _payload(r)) for r in records])
+
+    def _locate(self, con, username, record):
+        row = con.execute("SELECT owner, version, data FROM transactions WHERE id = ?",
+                          (record.get(ID_COL),)).fetchone()
+        if row is None or row[0] != owner_key(username):
+            raise ConflictError(f"Transakcja {record.get(ID_COL)} została usunięta w innej sesji")
+        check_version(record, row[1])
+        return row[1], json.loads(row[2])
+
+    def append(self, username, record):
+        with self._transaction() as con:
+            self._insert(con, username, [record])
+            self._bump(con)
+
+    def update(self, username, record, changes):
+        with self._transaction() as con:
+            version, data = self._locate(con, username, record)
+            data.update({c: plain_value(v) for c, v in changes.items() if c not in KEY_COLUMNS + (OWNER_COL,)})
+            con.execute("UPDATE transactions SET version = ?, data = ? WHERE id = ?",
+                        (version + 1, json.dumps(data, ensure_ascii=False), record[ID_COL]))
+            self._bump(con)
+        record.update(changes)
+        record[VERSION_COL] = version + 1
+
+    def delete(self, username, record):
+        with self._transaction() as con:
+            self._locate(con, username, record)
+            con.execute("DELETE FROM transactions WHERE id = ?", (record[ID_COL],))
+            self._bump(con)
+
+    def save(self, username, portfolio_list):
+        """Cały portfel jako różnica względem bazy: nowe wiersze, zmienione i usunięte - w jednej transakcji."""
+        with self._transaction() as con:
+            mine = {tx_id: (version, json.loads(data)) for tx_id, version, data in
+                    con.execute("SELECT id, version, data FROM transactions WHERE owner = ?", (owner_key(username),))}
+
+            known = [r for r in portfolio_list if r.get(ID_COL) in mine]
+            new = [r for r in portfolio_list if r.get(ID_COL) not in mine]
+            removed = set(mine) - {r.get(ID_COL) for r in known}
+            ids = [r[ID_COL] for r in new if r.get(ID_COL)]
+            if ids:
+                marks = ",".join("?" * len(ids))
+                taken = {row[0] for row in con.execute(f"SELECT id FROM transactions WHERE id IN ({marks})", ids)}
+                for r in new:
+                    if r.get(ID_COL) in taken:  # ID należy do cudzej transakcji - nadajemy nowe
+                        r.pop(ID_COL)
+
+            updates = []
+            for r in known:
+                version, data = mine[r[ID_COL]]
+                changes = {c: plain_value(v) for c, v in r.items()
+                           if c not in KEY_COLUMNS + (OWNER_COL,) and not same_value(v, data.get(c, ""))}
+                if changes:
+                    check_version(r, version)
+                    data.update(changes)
+                    updates.append((version + 1, json.dumps(data, ensure_ascii=False), r[ID_COL]))
+                    r[VERSION_COL] = version + 1
+
+            con.executemany("UPDATE transactions SET version = ?, data = ? WHERE id = ?", updates)
+            con.executemany("DELETE FROM transactions WHERE id = ?", [(tx_id,) for tx_id in removed])
+            self._insert(con, username, new)
+            if updates or removed or new:
+                self._bump(con)
+
+
+@st.cache_resource
+def get_db():
+    return TransactionDB()
+
+
+def load_user_data(username):
+    with stage('sqlite') as timing:
+        try:
+            db_revision, records = get_db().records(username)
+            timing['rows'] = len(records)
+            return db_revision, records
+        except Exception as e:
+            st.error(f"Błąd podczas ładowania danych: {e}")
+            return None, []
+
+
+def all_user_data():
+    return get_db().owners()
+
+
+def _guarded(action):
+    try:
+        action()
+        return True
+    except ConflictError as e:
+        st.error(f"{e}. Odśwież stronę i spróbuj ponownie.")
+        return False
+    except Exception as e:
+        st.error(f"Błąd podczas zapisu: {e}")
+        return False
+
+
+def append_transaction(username, record):
+    """Dopisuje jedną transakcję (nadaje jej ID i wersję)."""
+    return _guarded(lambda: get_db().append(username, record))
+
+
+def update_transaction(username, record, changes):
+    """Zmienia wskazane pola jednej transakcji, o ile nikt jej w międzyczasie nie zmienił."""
+    return _guarded(lambda: get_db().update(username, record, changes))
+
+
+def delete_transaction(username, record):
+    """Usuwa jedną transakcję, o ile nikt jej w międzyczasie nie zmienił."""
+    return _guarded(lambda: get_db().delete(username, record))
+
+
+def save_user_data(username, portfolio_list):
+    """Zapisuje cały portfel użytkownika jako różnicę względem bazy - portfele innych użytkowników zostają nietknięte."""
+    return _guarded(lambda: get_db().save(username, portfolio_list))
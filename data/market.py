@@ -1,170 +1,242 @@
-import yfinance as yf
+import os
 import pandas as pd
 import streamlit as st
 from datetime import datetime, timedelta
-from core.metrics import clean_timezone
+from data.cache import get_cache
+from data.fetch import FetchExecutor
+from core.fx import BASE_CURRENCY, cross_pairs, fx_matrix, live_rates, pair_symbol
+from core.portfolio import history_start
+from data.providers import get_provider
+from data.shared import SharedPriceStore
+from data.store import CACHE_DIR, PriceStore
+
+BENCHMARKS = {
+    "S&P 500": "^GSPC",
+    "NASDAQ 100": "^NDX",
+    "WIG20": "WIG20.WA",
+    "Złoto": "GC=F",
+    "Bitcoin": "BTC-USD"
+}
+
+
+@st.cache_resource
+def get_price_store():
+    # Osobny magazyn dla każdego źródła - dane offline nie mieszają się z prawdziwymi notowaniami
+    return PriceStore(os.path.join(CACHE_DIR, f"prices_{get_provider().name}.sqlite"))
+
+
+@st.cache_resource
+def get_shared_store():
+    # Notowania w pamięci wspólne dla wszystkich sesji - sesje dostają widoki kolumn, nie kopie
+    return SharedPriceStore()
+
+
+@st.cache_resource
+def get_fetcher():
+    # Jedna pula i jeden limit zapytań dla wszystkich sesji
+    return FetchExecutor()
+
+
+def _missing_columns(chunk, data):
+    return [s for s in chunk if s not in data.columns or data[s].isna().all()]
+
+
+def _missing_quotes(chunk, quotes):
+    return [s for s in chunk if s not in quotes]
+
+
+def _download_closes(tickers, start, end):
+    """Historia paczkami z ponowieniami. Zwraca (ceny symboli, które mają dane, symbole z błędem pobierania)."""
+    result = get_fetcher().run(lambda chunk: get_provider().history(chunk, start, end), tickers,
+                               missing=_missing_columns)
+    if result.errors:
+        st.warning(f"Nie udało się pobrać danych: {', '.join(result.errors)}")
+
+    frames = [p.dropna(axis=1, how='all') for p in result.parts if not p.empty]
+    frames = [f for f in frames if not f.columns.empty]
+    if not frames:
+        return pd.DataFrame(), list(result.errors)
+    return pd.concat(frames, axis=1), list(result.errors)
+
+
+def history_scope(symbol):
+    if symbol.endswith('=X'):
+        return 'fx'
+    if symbol in BENCHMARKS.values():
+        return 'benchmarks'
+    return 'history'
+
+
+def _fetch_history(symbols, start):
+    """Historia z lokalnego magazynu uzupełniona z sieci. Zwraca (ceny, symbole z błędem pobierania)."""
+    today = pd.Timestamp(datetime.now().date())
+
+    # Z sieci pobieramy tylko brakujące fragmenty, reszta pochodzi z lokalnego magazynu
+    store = get_price_store()
+    pending, failed = symbols, set()
+    for _ in range(2):  # druga runda: tickery, których historia została skorygowana (split, dywidenda)
+        stale = []
+        for (w_start, w_end), group in store.plan_fetch(pending, start, today).items():
+            closes, errors = _download_closes(group, w_start, w_end)
+            failed.update(errors)
+            # Pokrycie zapisujemy dla wszystkich symboli bez błędu pobierania - pusta odpowiedź
+            # (np. okno sprzed debiutu) też jest wynikiem; ponownie pobierane są tylko błędy
+            fetched = [t for t in group if t not in errors]
+            if fetched:
+                stale += store.write(closes, fetched, w_start, w_end)
+        if not stale:
+            break
+        pending = stale
+
+    return store.read(symbols, start), failed
+
+
+def _by_scope(symbols):
+    groups = {}
+    for s in symbols:
+        groups.setdefault(history_scope(s), []).append(s)
+    return groups
+
+
+def _ensure_history(symbols, start):
+    """Dociąga do wspólnego magazynu historię symboli, których w nim brak, wygasły albo zaczynają się za późno."""
+    # Pamięć podręczna per ticker: wpis (początek historii, czy są dane) obsługuje każde późniejsze start
+    cache, shared = get_cache(), get_shared_store()
+    missing = []
+    for s in symbols:
+        scope = history_scope(s)
+        hit, entry = cache.get(scope, s)
+        # Dane mogły zostać usunięte z magazynu (LRU) mimo ważnego wpisu
+        if not (hit and entry[0] <= start and (not entry[1] or (scope, s) in shared)):
+            missing.append(s)
+    if not missing:
+        return
+
+    fetched, failed = _fetch_history(missing, start)
+    for scope, group in _by_scope(missing).items():
+        columns = [s for s in group if s in fetched.columns and fetched[s].notna().any()]
+        if columns:
+            shared.put(scope, fetched[columns])
+        for s in group:
+            if s not in failed:  # błąd sieci nie trafia do cache - następny przebieg spróbuje ponownie
+                cache.put(scope, s, (start, s in columns))
+
+
+def _shared_frame(symbols, start):
+    """Ramka z wspólnego magazynu. Symbole jednego zakresu to widok bez kopii; kilka zakresów jest łączonych."""
+    shared = get_shared_store()
+    frames = [shared.view(scope, group, start) for scope, group in _by_scope(symbols).items()]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    data = pd.concat(frames, axis=1).sort_index()
+    return data[[s for s in symbols if s in data.columns]]
 
 
-@st.cache_data(ttl=3600, show_spinner=False)
 def get_market_data(tickers, start_date):
     if not tickers: 
         return pd.DataFrame()
-    
-    start = pd.to_datetime(start_date)
-    if (datetime.now() - start).days < 30:
-        start = datetime.now() - timedelta(days=365)
-    
-    for attempt in range(3):  # 3 próby
-        try:
-            data = yf.download(
-                tickers, 
-                start=start, 
-                end=datetime.now() + timedelta(days=1),
-                progress=False,
-                auto_adjust=True  # Uproszczone dane
-            )
-            
-            if data.empty:
-                if attempt < 2:
-                    continue
-                else:
-                    return pd.DataFrame()
-
-            if 'Close' in data.columns:
-                data = data['Close']
-            elif isinstance(data.columns, pd.MultiIndex):
-                if 'Close' in data.columns.get_level_values(0):
-                    data = data['Close']
-                
-            if isinstance(data, pd.Series):
-                data = data.to_frame()
-                data.columns = [tickers] if isinstance(tickers, str) else tickers
-                
-            return clean_timezone(data)
-            
-        except Exception as e:
-            if attempt == 2:  
-                st.warning(f"Nie udało się pobrać danych: {str(e)}")
-                return pd.DataFrame()
-    
-    return pd.DataFrame()
-
-
-@st.cache_data(ttl=300, show_spinner=False)
+    symbols = list(dict.fromkeys([tickers] if isinstance(tickers, str) else tickers))
+    start = history_start(start_date)
+    _ensure_history(symbols, start)
+    return _shared_frame(symbols, start)
+
+
 def get_live_prices(tickers):
     if not tickers: 
         return {}
-    
-    try:
-        data = yf.download(
-            tickers, 
-            period="5d", 
-            progress=False
-        )
-        
-        if data.empty:
-            return {}
-        if 'Close' in data.columns:
-            data = data['Close']
-        elif isinstance(data.columns, pd.MultiIndex):
-            if 'Close' in data.columns.get_level_values(0):
-                data = data['Close']
-
-        data = data.ffill()
-        
-        if isinstance(data, pd.Series):
-            return {tickers[0]: float(data.iloc[-1])} if not data.empty else {}
-        
-        last_prices = data.iloc[-1].to_dict()
-        return {t: float(p) for t, p in last_prices.items() if pd.notna(p)}
-        
-    except Exception as e:
-        st.warning(f"Błąd pobierania cen live: {str(e)}")
-        return {}
-
 
-@st.cache_data(ttl=900, show_spinner=False)
-def get_benchmark_data(symbols, start_date):
-    """Wrapper dla get_market_data z obsługą list"""
-    if not symbols: 
-        return pd.DataFrame()
-    return get_market_data(symbols, start_date)
+    cache = get_cache()
+    prices, missing = {}, []
+    for t in tickers:
+        hit, price = cache.get('live', t)
+        if not hit:
+            missing.append(t)
+        elif price is not None:
+            prices[t] = price
+
+    if missing:
+        result = get_fetcher().run(get_provider().quotes, missing, missing=_missing_quotes)
+        if result.errors:
+            st.warning(f"Błąd pobierania cen live: {', '.join(result.errors)}")
+        quotes = {}
+        for part in result.parts:
+            quotes.update(part)
+        for t in missing:
+            if t not in result.errors:
+                cache.put('live', t, quotes.get(t))
+            if t in quotes:
+                prices[t] = quotes[t]
+    return prices
+
+
+def invalidate_live(symbols):
+    """Odświeżenie notowań live tylko dla podanych symboli (np. portfela jednego użytkownika)."""
+    return get_cache().invalidate('live', symbols)
+
+
+def _fx_rates(currencies, quotes, hist_fx):
+    """Kursy do PLN z silnika FX: notowanie live (także krzyżowe), a gdy go brak - ostatni kurs z historii.
+    Waluty bez żadnego kursu są pomijane (z ostrzeżeniem) zamiast wyceniane po 1.0."""
+    rates, unknown = live_rates(currencies, quotes, hist_fx)
+    if unknown:
+        st.warning(f"Brak kursu walut: {', '.join(unknown)} - pozycje w tych walutach nie zostały wycenione.")
+    return rates
 
 
-@st.cache_data(ttl=900, show_spinner=False)
-def get_live_currencies(currencies):
-    """Pobiera kursy walut z fallbackiem"""
-    rates = {'PLN': 1.0}
-    to_fetch = [f"{c}PLN=X" for c in currencies if c != 'PLN']
-    
-    if not to_fetch: 
-        return rates
-
-    try:
-        data = yf.download(
-            to_fetch, 
-            period="5d",  
-            progress=False
-        )
-        
-        if data.empty:
-            for c in currencies:
-                if c != 'PLN': rates[c] = 1.0
-            return rates
-
-        if 'Close' in data.columns:
-            data = data['Close']
-        elif isinstance(data.columns, pd.MultiIndex):
-            if 'Close' in data.columns.get_level_values(0):
-                data = data['Close']
-            
-        data = data.ffill()  
-        
-        if isinstance(data, pd.Series):
-            curr_code = to_fetch[0].replace('PLN=X', '')
-            rates[curr_code] = float(data.iloc[-1]) if not data.empty else 1.0
-        else:
-            last_row = data.iloc[-1]
-            for col in data.columns:
-                curr_code = col.replace('PLN=X', '')
-                rates[curr_code] = float(last_row[col]) if pd.notna(last_row[col]) else 1.0
-                
-    except Exception as e:
-        for c in currencies:
-            if c not in rates: 
-                rates[c] = 1.0
-                
-    return rates
+def _unpriced(currencies, hist_fx):
+    """Waluty, których kursu do PLN nie da się wyznaczyć z pobranych par."""
+    matrix = fx_matrix(hist_fx, currencies, hist_fx.index)
+    return [c for c in currencies if matrix[c].isna().all()]
 
-def validate_ticker(ticker):
-    ticker = ticker.upper().strip().replace('.PL', '.WA')
-    try:
-        test = yf.download(ticker, period="5d", progress=False)
-        if test.empty:
-            return None, f"Symbol {ticker} nieznany lub brak danych"
-        return ticker, None
-    except Exception as e:
-        return None, f"Błąd walidacji: {str(e)}"
-
-
-def get_currency_rate(pair):
-    if not pair or "PLNPLN" in pair: 
-        return 1.0
-    try:
-        data = yf.download(pair, period="5d", progress=False)
-        
-        if data.empty:
-            return 1.0
-
-        if 'Close' in data.columns:
-            data = data['Close']
-        elif isinstance(data.columns, pd.MultiIndex):
-            if 'Close' in data.columns.get_level_values(0):
-                data = data['Close']
-                
-        if not data.empty:
-            return float(data.ffill().iloc[-1])
-        return 1.0
-    except Exception:
-        return 1.0
 
+def get_live_currencies(currencies):
+    """Pobiera kursy walut: pary bezpośrednie, kurs krzyżowy przez USD, a na końcu ostatni kurs historyczny"""
+    pairs = [pair_symbol(c) for c in currencies if c != BASE_CURRENCY]
+    quotes = get_live_prices(pairs)
+    _, missing = live_rates(currencies, quotes)
+    hist_fx = pd.DataFrame()
+    if missing:
+        legs = cross_pairs(missing)
+        quotes.update(get_live_prices(legs))
+        _, missing = live_rates(currencies, quotes)
+        if missing:
+            hist_fx = get_market_data([pair_symbol(c) for c in missing] + legs, datetime.now() - timedelta(days=30))
+    return _fx_rates(currencies, quotes, hist_fx)
+
+
+def load_market_data(tickers, currencies, benchmarks, start_date):
+    """Wszystkie dane rynkowe jednego przebiegu: jedno zapytanie historyczne i jedno live.
+    Zwraca (hist_prices, hist_fx, hist_bench, live_prices, live_fx) w dotychczasowych formatach."""
+    fx_pairs = [pair_symbol(c) for c in currencies if c != BASE_CURRENCY]
+    bench = {BENCHMARKS[b]: b for b in benchmarks if b in BENCHMARKS}
+
+    start = history_start(start_date)
+    _ensure_history(list(dict.fromkeys(tickers + fx_pairs + list(bench))), start)
+    live = get_live_prices(list(dict.fromkeys(tickers + fx_pairs)))
+
+    # Każda grupa dostaje tylko swoje dni notowań (np. BTC notowany jest także w weekendy)
+    hist_p = _shared_frame(tickers, start)
+    hist_f = _shared_frame(fx_pairs, start)
+    hist_b = _shared_frame(list(bench), start).rename(columns=bench)
+
+    missing = _unpriced(currencies, hist_f)
+    if missing:
+        # Brak pary bezpośredniej - dociągamy tylko pary do kursu krzyżowego przez USD
+        legs = [p for p in cross_pairs(missing) if p not in hist_f.columns]
+        extra = get_market_data(legs, start_date)
+        if not extra.empty:
+            hist_f = hist_f.join(extra, how='outer').dropna(how='all')
+        live.update(get_live_prices(legs))
+
+    unpriced = [c for c in _unpriced(currencies, hist_f) if c != BASE_CURRENCY]
+    if unpriced:
+        st.warning(f"Brak historii kursów walut: {', '.join(unpriced)} - "
+                   f"pozycje w tych walutach pominięto w krzywej kapitału i ROI.")
+
+    live_p = {t: live[t] for t in tickers if t in live}
+    live_f = _fx_rates(currencies, live, hist_f)
+
+    return hist_p, hist_f, hist_b, live_p, live_f
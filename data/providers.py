@@ -0,0 +1,164 @@
+import os
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from core.metrics import clean_timezone
+
+# Wybór źródła danych: "yfinance" (domyślnie) albo "fixture" (offline, deterministyczne)
+PROVIDER_ENV = "SUITSY_MARKET_PROVIDER"
+FIXTURE_DIR_ENV = "SUITSY_FIXTURE_DIR"
+
+
+def _close_frame(data, symbols):
+    """Wyciąga ceny zamknięcia z odpowiedzi yf.download (kolumny płaskie lub MultiIndex)."""
+    if 'Close' in data.columns:
+        data = data['Close']
+    elif isinstance(data.columns, pd.MultiIndex):
+        if 'Close' in data.columns.get_level_values(0):
+            data = data['Close']
+
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+        data.columns = symbols[:1]
+
+    return clean_timezone(data)
+
+
+SUFFIX_CURRENCIES = {'.WA': 'PLN', '.L': 'GBP', '.DE': 'EUR', '.PA': 'EUR', '.AS': 'EUR', '.SW': 'CHF'}
+
+
+def _currency_from_symbol(symbol):
+    if symbol.endswith('=X') and len(symbol) == 8:
+        return symbol[3:6]
+    for suffix, currency in SUFFIX_CURRENCIES.items():
+        if symbol.endswith(suffix):
+            return currency
+    return 'USD'
+
+
+class MarketDataProvider(ABC):
+    """Interfejs źródła notowań. Wszystkie ceny to zamknięcia dzienne, indeks bez strefy czasowej."""
+
+    name = None
+
+    @abstractmethod
+    def history(self, symbols, start, end):
+        """Ramka cen zamknięcia (daty × symbole) dla przedziału [start, end]."""
+
+    @abstractmethod
+    def quotes(self, symbols):
+        """Ostatnia znana cena każdego symbolu: {symbol: cena}. Symbole bez ceny są pomijane."""
+
+    @abstractmethod
+    def metadata(self, symbol):
+        """Informacje o instrumencie ({'symbol', 'currency'}) albo None, gdy symbol jest nieznany."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def history(self, symbols, start, end):
+        data = yf.download(
+            symbols,
+            start=start,
+            end=pd.Timestamp(end) + timedelta(days=1),
+            progress=False,
+            auto_adjust=True  # Uproszczone dane
+        )
+        if data is None or data.empty:
+            return pd.DataFrame()
+        return _close_frame(data, symbols)
+
+    def quotes(self, symbols):
+        data = yf.download(symbols, period="5d", progress=False)
+        if data is None or data.empty:
+            return {}
+
+        last_prices = _close_frame(data, symbols).ffill().iloc[-1].to_dict()
+        return {t: float(p) for t, p in last_prices.items() if pd.notna(p)}
+
+    def metadata(self, symbol):
+        # fast_info czyta tylko metadane notowań - .info jest wielokrotnie wolniejsze
+        try:
+            currency = yf.Ticker(symbol).fast_info['currency']
+        except KeyError:
+            return None
+        if not currency:
+            return None
+        return {'symbol': symbol, 'currency': currency.upper()}
+
+
+class FixtureProvider(MarketDataProvider):
+    """Źródło offline: ceny z plików CSV (<katalog>/<SYMBOL>.csv z kolumnami Date, Close),
+    a dla pozostałych symboli deterministyczne, syntetyczne błądzenie losowe."""
+
+    name = "fixture"
+    EPOCH = pd.Timestamp("2000-01-03")
+    FX_LEVELS = {'USD': 4.0, 'EUR': 4.3, 'GBP': 5.0, 'CHF': 4.4}
+
+    def __init__(self, fixture_dir=None):
+        self.fixture_dir = fixture_dir
+
+    def _from_file(self, symbol):
+        if not self.fixture_dir:
+            return None
+        path = os.path.join(self.fixture_dir, f"{symbol}.csv")
+        if not os.path.exists(path):
+            return None
+        data = pd.read_csv(path, index_col='Date', parse_dates=True)
+        return data['Close'].astype(float)
+
+    def _synthetic(self, symbol, end):
+        # Ziarno z nazwy symbolu, start zawsze od EPOCH - cena danego dnia nie zależy od zapytania
+        seed = zlib.crc32(symbol.encode())
+        rng = np.random.default_rng(seed)
+        freq = 'D' if symbol.endswith('-USD') else 'B'
+        index = pd.date_range(self.EPOCH, end, freq=freq)
+
+        if symbol.endswith('=X'):
+            level, drift, vol = self.FX_LEVELS.get(symbol[:3], 1.0 + seed % 500 / 100), 0.0, 0.003
+        else:
+            level, drift, vol = 20.0 + seed % 480, 0.0002, 0.015
+        return pd.Series(level * np.exp(np.cumsum(rng.normal(drift, vol, len(index)))), index=index)
+
+    def _series(self, symbol, end):
+        series = self._from_file(symbol)
+        return series if series is not None else self._synthetic(symbol, end)
+
+    def history(self, symbols, start, end):
+        end = min(pd.Timestamp(end), pd.Timestamp(datetime.now().date()))
+        if not symbols or pd.Timestamp(start) > end:
+            return pd.DataFrame()
+        data = pd.DataFrame({s: self._series(s, end) for s in symbols})
+        return data.loc[pd.Timestamp(start):end]
+
+    def quotes(self, symbols):
+        if not symbols:
+            return {}
+        today = pd.Timestamp(datetime.now().date())
+        last_prices = self.history(symbols, today - timedelta(days=7), today).ffill()
+        if last_prices.empty:
+            return {}
+        return {t: float(p) for t, p in last_prices.iloc[-1].items() if pd.notna(p)}
+
+    def metadata(self, symbol):
+        return {'symbol': symbol, 'currency': _currency_from_symbol(symbol)}
+
+
+PROVIDERS = {p.name: p for p in (YFinanceProvider, FixtureProvider)}
+
+
+@lru_cache(maxsize=None)
+def get_provider(name=None):
+    name = name or os.environ.get(PROVIDER_ENV, YFinanceProvider.name)
+    if name not in PROVIDERS:
+        raise ValueError(f"Nieznane źródło danych rynkowych: {name} (dostępne: {', '.join(PROVIDERS)})")
+    if name == FixtureProvider.name:
+        return FixtureProvider(os.environ.get(FIXTURE_DIR_ENV))
+    return PROVIDERS[name]()
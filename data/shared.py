@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Wspólny dla procesu magazyn notowań tylko do odczytu. Każdy zakres (history/fx/benchmarks) to jeden
+# niezmienny blok: wspólna oś dat × symbole, wiersz symbolu ciągły w pamięci. Sesje dostają ramki
+# zbudowane z widoków tych wierszy - bez kopiowania i bez deserializacji przy każdym trafieniu.
+STORE_DTYPE = os.environ.get("SUITSY_STORE_DTYPE", "float64")       # "float32" - połowa pamięci
+STORE_MAX_MB = float(os.environ.get("SUITSY_STORE_MAX_MB", "512"))  # powyżej - usuwanie najdawniej używanych
+STORE_MMAP_DIR = os.environ.get("SUITSY_STORE_MMAP_DIR")            # bloki jako pliki .npy mapowane w pamięć
+
+
+class _Block:
+    """Niezmienny blok zakresu. Zmiana (dopisanie, usunięcie symboli) tworzy nowy blok -
+    widoki wydane wcześniej sesjom wskazują na stary i pozostają poprawne."""
+
+    def __init__(self, dates, symbols, values, path=None):
+        self.dates = dates                              # DatetimeIndex, rosnąco
+        self.symbols = pd.CategoricalIndex(symbols)     # kody symboli zamiast obiektów str
+        self.values = values                            # (symbole × daty), tylko do odczytu
+        self.path = path
+
+    @property
+    def nbytes(self):
+        return int(self.values.nbytes + self.dates.nbytes)
+
+
+EMPTY_BLOCK = _Block(pd.DatetimeIndex([]), [], np.empty((0, 0)))
+
+
+class SharedPriceStore:
+    """Notowania wspólne dla wszystkich sesji procesu (w st.cache_resource).
+
+    put() dopisuje kolumny do bloku zakresu, view() zwraca ramkę (daty × symbole) złożoną z widoków
+    bloku - bez kopii, jeśli wybrane symbole mają notowania w tych samych dniach (typowo: jedna giełda).
+    Po przekroczeniu limitu pamięci usuwane są symbole najdawniej czytane (LRU)."""
+
+    def __init__(self, dtype=STORE_DTYPE, max_bytes=STORE_MAX_MB * 2 ** 20, mmap_dir=STORE_MMAP_DIR):
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.mmap_dir = mmap_dir
+        if mmap_dir:
+            os.makedirs(mmap_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.blocks = {}
+        self.recent = OrderedDict()   # (zakres, symbol) -> None, od najdawniej czytanych
+        self.evicted = 0
+
+    def _block(self, scope):
+        return self.blocks.get(scope, EMPTY_BLOCK)
+
+    def __contains__(self, key):
+        scope, symbol = key
+        return symbol in self._block(scope).symbols
+
+    def _freeze(self, scope, values):
+        """Tablica bloku tylko do odczytu - w pamięci procesu albo w pliku .npy mapowanym w pamięć."""
+        if not self.mmap_dir:
+            values.setflags(write=False)
+            return values, None
+        fd, path = tempfile.mkstemp(prefix=f"{scope}_{uuid.uuid4().hex[:8]}_", suffix=".npy", dir=self.mmap_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, values)
+        return np.load(path, mmap_mode='r'), path
+
+    def _replace(self, scope, dates, symbols, values):
+        old = self._block(scope)
+        if symbols:
+            values, path = self._freeze(scope, values)
+            self.blocks[scope] = _Block(dates, symbols, values, path)
+        else:
+            self.blocks.pop(scope, None)
+        if old.path:
+            try:
+                # Mapowania otwarte przez sesje pozostają ważne (Linux); na Windows plik zostanie przy następnej próbie
+                os.remove(old.path)
+            except OSError:
+                pass
+
+    def _rebuild(self, block, keep, frame=None):
+        """Nowa zawartość bloku: wybrane symbole starego bloku plus kolumny frame (nadpisują stare)."""
+        new = [] if frame is None else list(frame.columns)
+        keep = [s for s in keep if s not in new]
+        dates = block.dates if frame is None else block.dates.union(frame.index)
+        values = np.full((len(keep) + len(new), len(dates)), np.nan, dtype=self.dtype)
+        if keep:
+            rows = block.symbols.get_indexer(keep)
+            values[:len(keep), dates.get_indexer(block.dates)] = block.values[rows]
+        if new:
+            values[len(keep):, dates.get_indexer(frame.index)] = frame.to_numpy(dtype=self.dtype).T
+        # Dni bez żadnego notowania (np. po usunięciu jedynego symbolu notowanego w weekendy) wypadają z osi
+        used = ~np.isnan(values).all(axis=0)
+        if not used.all():
+            dates, values = dates[used], np.ascontiguousarray(values[:, used])
+        return dates, keep + new, values
+
+    def put(self, scope, frame):
+        """Dopisuje kolumny frame (daty × symbole) do zakresu, zastępując wcześniejsze dane tych symboli."""
+        frame = frame.dropna(axis=1, how='all')
+        with self.lock:
+            block = self._block(scope)
+            dates, symbols, values = self._rebuild(block, list(block.symbols), frame.sort_index())
+            self._replace(scope, dates, symbols, values)
+            self._touch(scope, frame.columns)
+            self._evict(protect={(scope, s) for s in frame.columns})
+
+    def _touch(self, scope, symbols):
+        for s in symbols:
+            self.recent[(scope, s)] = None
+            self.recent.move_to_end((scope, s))
+
+    def _evict(self, protect=()):
+        """Usuwa najdawniej czytane symbole, aż magazyn zmieści się w limicie (bez świeżo dopisanych)."""
+        if self.max_bytes is None or self._nbytes() <= self.max_bytes:
+            return
+        drop = {}
+        days = {scope: len(b.dates) for scope, b in self.blocks.items()}
+        estimate = self._nbytes()
+        for key in list(self.recent):
+            if estimate <= self.max_bytes:
+                break
+            if key in protect:
+                continue
+            scope, symbol = key
+            if scope not in days:
+                continue
+            drop.setdefault(scope, set()).add(symbol)
+            del self.recent[key]
+            # Przybliżenie: oś dat bloku się nie zmienia
+            estimate -= days[scope] * self.dtype.itemsize
+        for scope, symbols in drop.items():
+            block = self._block(scope)
+            keep = [s for s in block.symbols if s not in symbols]
+            self._replace(scope, *self._rebuild(block, keep))
+            self.evicted += len(block.symbols) - len(keep)
+
+    def _nbytes(self):
+        return sum(b.nbytes for b in self.blocks.values())
+
+    def view(self, scope, symbols, start=None):
+        """Ramka (daty × symbole) z widoków bloku od start. Symbole bez danych są pomijane;
+        dni, w których żaden z wybranych symboli nie ma notowania, wypadają (wtedy ramka jest kopią)."""
+        with self.lock:
+            block = self._block(scope)
+            rows = {s: i for s, i in zip(symbols, block.symbols.get_indexer(symbols)) if i >= 0}
+            self._touch(scope, rows)
+        if not rows:
+            return pd.DataFrame()
+        lo = 0 if start is None else block.dates.searchsorted(pd.Timestamp(start))
+        frame = pd.DataFrame({s: np.asarray(block.values[i, lo:]) for s, i in rows.items()},
+                             index=block.dates[lo:], copy=False)
+        used = frame.notna().any(axis=1).to_numpy()
+        return frame if used.all() else frame[used]
+
+    def footprint(self):
+        """Zajętość pamięci: łącznie i per zakres (symbole, dni, bajty)."""
+        with self.lock:
+            scopes = {scope: {'symbols': len(b.symbols), 'days': len(b.dates), 'bytes': b.nbytes}
+                      for scope, b in self.blocks.items()}
+            return {'bytes': sum(s['bytes'] for s in scopes.values()), 'limit': self.max_bytes,
+                    'dtype': self.dtype.name, 'mapped': bool(self.mmap_dir), 'evicted': self.evicted,
+                    'scopes': scopes}
@@ -1,12 +1,27 @@
+import argparse
+import logging
+import sys
+import threading
+import time
 import gspread
 import pandas as pd
 import streamlit as st
+from core.timing import stage
+from data.storage import (ID_COL, OWNER_COL, VERSION_COL, ConflictError, check_version, new_transaction_id, owner_key,
+                          plain_value, same_value)
+from gspread.utils import ValueRenderOption, rowcol_to_a1
 from google.oauth2.service_account import Credentials
 
 # Pozostaw linki bez zmian
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1dmalD519xdQzbi2Pef1kFsRj29PyyxEH6zTNcuV3aR4/edit"
 WORKSHEET_NAME = "Arkusz1"
 
+# Co ile sekund (najczęściej) pytamy Drive o datę modyfikacji arkusza
+REVISION_CHECK_INTERVAL = 30
+
+logger = logging.getLogger("suitsy.sheets")
+
+
 @st.cache_resource
 def get_gspread_client():
     # 1. Pobieramy sekrety i OD RAZU konwertujemy je na zwykły słownik
@@ -26,6 +41,7 @@ def get_gspread_client():
     creds = Credentials.from_service_account_info(creds_info, scopes=scope)
     return gspread.authorize(creds)
 
+@st.cache_resource
 def get_worksheet():
     try:
         sh = get_gspread_client().open_by_url(SPREADSHEET_URL)
@@ -35,45 +51,346 @@ def get_worksheet():
         sh = get_gspread_client().open_by_url(SPREADSHEET_URL)
         return sh.get_worksheet(0)
 
+
+class SheetSnapshot:
+    """Wspólna dla wszystkich sesji kopia arkusza, zindeksowana po właścicielu.
+    Przeładowywana po zapisie z aplikacji albo gdy Drive zgłosi nowszą datę modyfikacji."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.modified = None      # data modyfikacji z Drive przy ostatnim wczytaniu
+        self.revision = None      # wersja wczytanych danych (klucz cache i migawek batch.py)
+        self.version = 0
+        self.by_owner = {}
+        self.checked_at = 0.0
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def refresh(self, ws):
+        with self.lock:
+            now = time.monotonic()
+            if not self.stale and now - self.checked_at < REVISION_CHECK_INTERVAL:
+                return
+            try:
+                modified = ws.spreadsheet.get_lastUpdateTime()
+            except Exception as e:
+                if self.revision is None:
+                    raise
+                # Drive niedostępny: zostajemy przy migawce; po zapisie z aplikacji i tak wczytujemy arkusz
+                logger.warning("Nie udało się sprawdzić daty modyfikacji arkusza: %s", e)
+                self.checked_at = now
+                if not self.stale:
+                    return
+                modified = self.modified
+            self.checked_at = now
+            if not self.stale and modified == self.modified:
+                return
+            self._load(ws)
+            self.version += 1
+            # Drive bywa spóźniony z datą modyfikacji: przeładowanie po zapisie przy niezmienionej dacie
+            # dostaje własną wersję, żeby nie trafić w cache poprzedniego stanu arkusza
+            self.revision = modified if modified != self.modified else f"{modified}#{self.version}"
+            self.modified = modified
+            self.stale = False
+
+    def _load(self, ws):
+        data = ws.get_all_records()
+        df = pd.DataFrame(data)
+        if df.empty or OWNER_COL not in df.columns:
+            self.by_owner = {}
+            return
+
+        df = df[~_cleared(df)]
+        if any(c not in df.columns or (df[c].astype(str) == "").any() for c in (ID_COL, VERSION_COL)):
+            # Starsze wiersze bez ID/Wersji - jednorazowa migracja i ponowny odczyt
+            _sheet_index(ws)
+            df = pd.DataFrame(ws.get_all_records())
+            df = df[~_cleared(df)]
+
+        keys = df[OWNER_COL].map(owner_key)
+        self.by_owner = {k: g.to_dict('records') for k, g in df.groupby(keys, sort=False)}
+
+    def records(self, username):
+        """(wersja danych, kopie wierszy użytkownika) - oba z tego samego wczytania arkusza."""
+        with self.lock:
+            return self.revision, [dict(r) for r in self.by_owner.get(owner_key(username), [])]
+
+    def owners(self):
+        """(wersja danych, {klucz właściciela: kopie wierszy}) - oba z tego samego wczytania arkusza."""
+        with self.lock:
+            return self.revision, {owner: [dict(r) for r in rows] for owner, rows in self.by_owner.items()}
+
+
+@st.cache_resource
+def get_sheet_snapshot():
+    return SheetSnapshot()
+
+
 def load_user_data(username):
+    snapshot = get_sheet_snapshot()
+    with stage('sheets') as timing:
+        try:
+            version = snapshot.version
+            snapshot.refresh(get_worksheet())
+            # Ta sama wersja migawki = odczyt bez zapytania o dane arkusza
+            timing['cache_hits' if snapshot.version == version else 'cache_misses'] = 1
+            revision, records = snapshot.records(username)
+            timing['rows'] = len(records)
+            return revision, records
+        except Exception as e:
+            if snapshot.revision is not None:
+                # Ostatnie poprawne wczytanie arkusza jest lepsze niż pusty portfel
+                logger.warning("Błąd odświeżania arkusza, dane z migawki %s: %s", snapshot.revision, e)
+                return snapshot.records(username)
+            st.error(f"Błąd podczas ładowania danych: {e}")
+            return None, []
+
+
+def all_user_data():
+    """Wersja danych arkusza i transakcje wszystkich właścicieli (świeży odczyt, jeśli arkusz się zmienił)."""
+    snapshot = get_sheet_snapshot()
+    snapshot.refresh(get_worksheet())
+    return snapshot.owners()
+
+
+def _cleared(df):
+    """Wiersze wyczyszczone po usunięciu transakcji (bez ID i właściciela) - pomijane do czasu kompaktowania."""
+    blank = pd.Series(True, index=df.index)
+    for c in (ID_COL, OWNER_COL):
+        if c in df.columns:
+            blank &= df[c].astype(str).str.strip() == ""
+    return blank
+
+
+def _col_letter(col):
+    return rowcol_to_a1(1, col)[:-1]
+
+
+def _sheet_index(ws, columns=()):
+    """Nagłówek oraz {ID: (nr wiersza, właściciel, wersja)}.
+    Czyta tylko nagłówek i kolumny kluczowe; przy okazji nadaje ID/Wersję starszym wierszom."""
+    header = ws.row_values(1)
+    missing = [c for c in [ID_COL, VERSION_COL, OWNER_COL] + list(columns) if c not in header]
+    if missing:
+        header = header + list(dict.fromkeys(missing))
+        if ws.col_count < len(header):
+            ws.add_cols(len(header) - ws.col_count)
+        ws.update([header], "A1")
+
+    keys = [_col_letter(header.index(c) + 1) for c in (ID_COL, OWNER_COL, VERSION_COL)]
+    ids, owners, versions = (
+        [r[0] if r else "" for r in col] for col in ws.batch_get([f"{k}2:{k}" for k in keys])
+    )
+    n_rows = max(len(ids), len(owners), len(versions))
+
+    index, migration = {}, []
+    for i in range(n_rows):
+        row = i + 2
+        tx_id = ids[i] if i < len(ids) else ""
+        version = versions[i] if i < len(versions) else ""
+        owner = owners[i] if i < len(owners) else ""
+        if not str(tx_id).strip() and not str(owner).strip():
+            continue  # wiersz usuniętej transakcji - czeka na kompaktowanie
+        if not tx_id:
+            tx_id = new_transaction_id()
+            migration.append({'range': f"{keys[0]}{row}", 'values': [[tx_id]]})
+        if not str(version).strip():
+            version = 1
+            migration.append({'range': f"{keys[2]}{row}", 'values': [[version]]})
+        index[tx_id] = (row, owner_key(owner), int(version))
+    if migration:
+        ws.batch_update(migration)
+
+    return header, index
+
+
+def _locate(index, username, record):
+    tx_id = record.get(ID_COL)
+    if tx_id not in index or index[tx_id][1] != owner_key(username):
+        raise ConflictError(f"Transakcja {tx_id} została usunięta w innej sesji")
+    row, _, version = index[tx_id]
+    check_version(record, version)
+    return row, version
+
+
+def _verify_rows(ws, header, targets):
+    """Ponowny odczyt komórek ID tuż przed zapisem: {nr wiersza: ID}. Wiersz z innym ID (arkusz zmieniony
+    w międzyczasie, np. kompaktowaniem) to konflikt - zapis trafiłby w cudzą transakcję."""
+    if not targets:
+        return
+    col = _col_letter(header.index(ID_COL) + 1)
+    rows = list(targets)
+    current = ws.batch_get([f"{col}{row}" for row in rows])
+    for row, values in zip(rows, current):
+        found = values[0][0] if values and values[0] else ""
+        if str(found) != str(targets[row]):
+            raise ConflictError(f"Transakcja {targets[row]} została zmieniona w innej sesji")
+
+
+def _clear_rows(ws, header, rows):
+    # Bez fizycznego usuwania - numeracja wierszy pozostałych transakcji się nie przesuwa.
+    # Puste wiersze usuwa compact_sheet() uruchamiane poza godzinami pracy aplikacji.
+    last = _col_letter(len(header))
+    ws.batch_clear([f"A{row}:{last}{row}" for row in rows])
+
+
+def _append(ws, header, username, records):
+    for r in records:
+        r[ID_COL] = r.get(ID_COL) or new_transaction_id()
+        r[VERSION_COL] = 1
+        r[OWNER_COL] = username
+    ws.append_rows([[plain_value(r.get(c, "")) for c in header] for r in records], table_range="A1")
+
+
+def _update(header, row, version, changes):
+    data = [{'range': rowcol_to_a1(row, header.index(c) + 1), 'values': [[plain_value(v)]]}
+            for c, v in changes.items() if c not in (ID_COL, VERSION_COL, OWNER_COL)]
+    data.append({'range': rowcol_to_a1(row, header.index(VERSION_COL) + 1), 'values': [[version + 1]]})
+    return data
+
+
+def append_transaction(username, record):
+    """Dopisuje jedną transakcję na końcu arkusza (nadaje jej ID i wersję)."""
     try:
         ws = get_worksheet()
-        data = ws.get_all_records()
-        if not data:
-            return []
-            
-        df = pd.DataFrame(data)
- 
-        if 'Wlasciciel' in df.columns:
-            df['Wlasciciel_Lower'] = df['Wlasciciel'].astype(str).str.strip().str.lower()
-            filtered_df = df[df['Wlasciciel_Lower'] == username.strip().lower()]
-            return filtered_df.drop(columns=['Wlasciciel_Lower']).to_dict('records')
-            
-        return []
+        header, _ = _sheet_index(ws, record.keys())
+        _append(ws, header, username, [record])
+        return True
+    except Exception as e:
+        st.error(f"Błąd podczas zapisu: {e}")
+        return False
+    finally:
+        # Także po konflikcie lub częściowym zapisie - arkusz mógł się zmienić
+        get_sheet_snapshot().invalidate()
+
+
+def update_transaction(username, record, changes):
+    """Zmienia wskazane pola jednej transakcji, o ile nikt jej w międzyczasie nie zmienił."""
+    try:
+        ws = get_worksheet()
+        header, index = _sheet_index(ws, changes.keys())
+        row, version = _locate(index, username, record)
+        _verify_rows(ws, header, {row: record[ID_COL]})
+        ws.batch_update(_update(header, row, version, changes))
+        record.update(changes)
+        record[VERSION_COL] = version + 1
+        return True
+    except ConflictError as e:
+        st.error(f"{e}. Odśwież stronę i spróbuj ponownie.")
+        return False
     except Exception as e:
-        st.error(f"Błąd podczas ładowania danych: {e}")
-        return []
+        st.error(f"Błąd podczas zapisu: {e}")
+        return False
+    finally:
+        get_sheet_snapshot().invalidate()
+
+
+def delete_transaction(username, record):
+    """Usuwa jedną transakcję, o ile nikt jej w międzyczasie nie zmienił."""
+    try:
+        ws = get_worksheet()
+        header, index = _sheet_index(ws)
+        row, _ = _locate(index, username, record)
+        _verify_rows(ws, header, {row: record[ID_COL]})
+        _clear_rows(ws, header, [row])
+        return True
+    except ConflictError as e:
+        st.error(f"{e}. Odśwież stronę i spróbuj ponownie.")
+        return False
+    except Exception as e:
+        st.error(f"Błąd podczas zapisu: {e}")
+        return False
+    finally:
+        get_sheet_snapshot().invalidate()
+
 
 def save_user_data(username, portfolio_list):
+    """Zapisuje cały portfel użytkownika jako różnicę względem arkusza:
+    dopisuje nowe wiersze, aktualizuje zmienione i usuwa brakujące - reszta arkusza zostaje nietknięta."""
     try:
         ws = get_worksheet()
-        all_data = ws.get_all_records()
-        all_df = pd.DataFrame(all_data) if all_data else pd.DataFrame()
-        
-        if not all_df.empty and 'Wlasciciel' in all_df.columns:
-            others = all_df[all_df['Wlasciciel'].astype(str).str.lower() != username.lower()]
-        else:
-            others = pd.DataFrame()
+        columns = {c for r in portfolio_list for c in r}
+        header, index = _sheet_index(ws, columns)
+        mine = {tx_id for tx_id, (_, owner, _) in index.items() if owner == owner_key(username)}
 
-        new_user_df = pd.DataFrame(portfolio_list)
-        new_user_df['Wlasciciel'] = username
-        
-        final = pd.concat([others, new_user_df], ignore_index=True)
-        
-        ws.clear()
-        ws.update([final.columns.tolist()] + final.values.tolist())
+        known = [r for r in portfolio_list if r.get(ID_COL) in mine]
+        new = [r for r in portfolio_list if r.get(ID_COL) not in mine]
+        removed = mine - {r.get(ID_COL) for r in known}
+        for r in new:
+            if r.get(ID_COL) in index:  # ID należy do cudzego wiersza - nadajemy nowe
+                r.pop(ID_COL)
+
+        # Porównujemy tylko wiersze tego użytkownika; wersję sprawdzamy dla wierszy, które się zmieniają
+        updates, touched = [], {}
+        if known:
+            last = _col_letter(len(header))
+            current = ws.batch_get([f"A{index[r[ID_COL]][0]}:{last}{index[r[ID_COL]][0]}" for r in known],
+                                   value_render_option=ValueRenderOption.unformatted)
+            for r, values in zip(known, current):
+                row, _, version = index[r[ID_COL]]
+                values = (values[0] if values else []) + [""] * len(header)
+                changes = {c: r[c] for c in r
+                           if c in header and c not in (ID_COL, VERSION_COL, OWNER_COL)
+                           and not same_value(r[c], values[header.index(c)])}
+                if changes:
+                    check_version(r, version)
+                    updates += _update(header, row, version, changes)
+                    touched[row] = r[ID_COL]
+                    r[VERSION_COL] = version + 1
+
+        touched.update({index[tx_id][0]: tx_id for tx_id in removed})
+        _verify_rows(ws, header, touched)
+        if updates:
+            ws.batch_update(updates)
+        if removed:
+            _clear_rows(ws, header, [index[tx_id][0] for tx_id in removed])
+        if new:
+            _append(ws, header, username, new)
         return True
+    except ConflictError as e:
+        st.error(f"{e}. Odśwież stronę i spróbuj ponownie.")
+        return False
     except Exception as e:
         st.error(f"Błąd podczas zapisu: {e}")
         return False
+    finally:
+        get_sheet_snapshot().invalidate()
+
+
+def compact_sheet():
+    """Usuwa z arkusza puste wiersze po usuniętych transakcjach i zwraca ich liczbę.
+    Przesuwa numerację wierszy - uruchamiać, gdy nikt nie zapisuje (zapis w trakcie wykryje _verify_rows)."""
+    ws = get_worksheet()
+    header = ws.row_values(1)
+    if ID_COL not in header or OWNER_COL not in header:
+        return 0
+    keys = [_col_letter(header.index(c) + 1) for c in (ID_COL, OWNER_COL)]
+    ids, owners = ([r[0] if r else "" for r in col] for col in ws.batch_get([f"{k}2:{k}" for k in keys]))
+    n_rows = max(len(ids), len(owners))
+    blank = [i + 2 for i in range(n_rows)
+             if not str(ids[i] if i < len(ids) else "").strip() and not str(owners[i] if i < len(owners) else "").strip()]
+
+    # Od dołu, całymi blokami sąsiednich wierszy - numeracja wyżej się nie przesuwa
+    rows = sorted(blank, reverse=True)
+    while rows:
+        end = start = rows.pop(0)
+        while rows and rows[0] == start - 1:
+            start = rows.pop(0)
+        ws.delete_rows(start, end)
+    get_sheet_snapshot().invalidate()
+    return len(blank)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Konserwacja arkusza transakcji.")
+    parser.add_argument('--compact', action='store_true', help="usuń puste wiersze po usuniętych transakcjach")
+    args = parser.parse_args(argv)
+    if args.compact:
+        print(f"Usunięto {compact_sheet()} pustych wierszy")
+    return 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())
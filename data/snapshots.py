@@ -0,0 +1,46 @@
+import hashlib
+import os
+import pickle
+import time
+
+from data.store import CACHE_DIR
+
+# Gotowe wyniki portfeli liczone przez batch.py - UI wczytuje je zamiast liczyć przy pierwszej wizycie
+SNAPSHOT_DIR = os.environ.get("SUITSY_SNAPSHOT_DIR", os.path.join(CACHE_DIR, "snapshots"))
+SNAPSHOT_MAX_AGE = 3600  # s - starsze wyniki mają już nieaktualne notowania
+SNAPSHOT_FORMAT = 3      # zmiana zawartości wyniku unieważnia stare pliki
+
+
+def snapshot_path(owner, directory=None):
+    # Nazwa pliku ze skrótu właściciela - nick może zawierać dowolne znaki
+    digest = hashlib.blake2b(str(owner).strip().lower().encode(), digest_size=12).hexdigest()
+    return os.path.join(directory or SNAPSHOT_DIR, f"{digest}.pkl")
+
+
+def write_snapshot(owner, revision, result, directory=None):
+    """Zapis atomowy (plik tymczasowy + rename) - czytelnik nigdy nie widzi połowy pliku."""
+    path = snapshot_path(owner, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {'format': SNAPSHOT_FORMAT, 'owner': str(owner).strip().lower(), 'revision': revision,
+               'created': time.time(), 'result': result}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+
+def read_snapshot(owner, revision, max_age=SNAPSHOT_MAX_AGE, directory=None):
+    """Wynik portfela, jeśli policzono go dla tej samej wersji arkusza i nie jest starszy niż max_age."""
+    path = snapshot_path(owner, directory)
+    if revision is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception:
+        return None
+    if payload.get('format') != SNAPSHOT_FORMAT or payload.get('revision') != revision \
+            or time.time() - payload.get('created', 0) > max_age:
+        return None
+    return payload['result']
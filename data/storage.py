@@ -0,0 +1,155 @@
+"""Magazyn transakcji: wspólny interfejs dla arkusza Google (data/sheets.py) i lokalnej bazy SQLite
+(data/localdb.py). Backend wybiera zmienna SUITSY_STORAGE ("sheets" - domyślnie, albo "sqlite").
+
+Kopiowanie transakcji między backendami (np. przejście na pracę offline):
+
+    python -m data.storage --from sheets --to sqlite [--owners kamil ola]
+"""
+import argparse
+import importlib
+import logging
+import os
+import sys
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from core.ingest import parse_transactions
+
+STORAGE_ENV = "SUITSY_STORAGE"
+BACKENDS = {'sheets': 'data.sheets', 'sqlite': 'data.localdb'}
+
+ID_COL = 'ID'
+VERSION_COL = 'Wersja'
+OWNER_COL = 'Wlasciciel'
+
+logger = logging.getLogger("suitsy.storage")
+
+
+class ConflictError(Exception):
+    """Wiersz został w międzyczasie zmieniony lub usunięty w innej sesji."""
+
+
+def new_transaction_id():
+    # Prefiks "T" - gspread nie zamieni identyfikatora na liczbę przy odczycie
+    return "T" + uuid.uuid4().hex[:12]
+
+
+def owner_key(val):
+    return str(val).strip().lower()
+
+
+def plain_value(val):
+    """Wartość do zapisu: None/NaN jako pusta komórka, skalary numpy jako typy Pythona."""
+    if val is None or (isinstance(val, float) and pd.isna(val)):
+        return ""
+    return val.item() if hasattr(val, 'item') else val
+
+
+def same_value(new, old):
+    new = plain_value(new)
+    if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+        return abs(new - old) <= 1e-9 * max(1.0, abs(old))
+    return str(new) == str(old)
+
+
+def check_version(record, version):
+    expected = record.get(VERSION_COL)
+    if expected not in (None, "") and int(expected) != version:
+        raise ConflictError(f"Transakcja {record.get(ID_COL)} została zmieniona w innej sesji")
+
+
+def _backend_name(name=None):
+    name = name or os.environ.get(STORAGE_ENV, 'sheets')
+    if name not in BACKENDS:
+        raise ValueError(f"Nieznany magazyn transakcji: {name} (dostępne: {', '.join(BACKENDS)})")
+    return name
+
+
+def get_backend(name=None):
+    """Moduł backendu. Import dopiero przy wyborze - tryb sqlite nie wymaga gspread ani poświadczeń Google."""
+    name = _backend_name(name)
+    return importlib.import_module(BACKENDS[name])
+
+
+def load_user_data(username):
+    """(wersja danych, transakcje użytkownika) - z jednego odczytu; wersja None, jeśli odczyt się nie udał."""
+    return get_backend().load_user_data(username)
+
+
+def save_user_data(username, portfolio_list):
+    return get_backend().save_user_data(username, portfolio_list)
+
+
+def append_transaction(username, record):
+    return get_backend().append_transaction(username, record)
+
+
+def update_transaction(username, record, changes):
+    return get_backend().update_transaction(username, record, changes)
+
+
+def delete_transaction(username, record):
+    return get_backend().delete_transaction(username, record)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _parsed_transactions(backend, owner, revision, _records):
+    return parse_transactions(_records)
+
+
+def load_transactions(username, records, revision):
+    """Ramka transakcji i odrzucone wiersze (core/ingest.py) - parsowane raz na wersję danych (wspólne dla sesji).
+    revision musi pochodzić z tego samego odczytu co records - inaczej cudzy zapis w międzyczasie
+    zapisałby w cache stare wiersze pod nową wersją."""
+    if revision is None:
+        return parse_transactions(records)
+    return _parsed_transactions(_backend_name(), owner_key(username), revision, records)
+
+
+def all_user_data():
+    """(wersja, {klucz właściciela: transakcje}) - dane wszystkich użytkowników, np. dla batch.py."""
+    return get_backend().all_user_data()
+
+
+def copy_transactions(source, target, owners=None):
+    """Przenosi portfele z backendu source do target z zachowaniem ID transakcji.
+    Zapis to save_user_data, więc ponowne uruchomienie dopisuje tylko różnice; portfele spoza source zostają.
+    Zwraca {właściciel: liczba transakcji} dla skopiowanych portfeli."""
+    _, portfolios = get_backend(source).all_user_data()
+    if owners:
+        wanted = {owner_key(o) for o in owners}
+        portfolios = {o: rows for o, rows in portfolios.items() if o in wanted}
+
+    dst, copied = get_backend(target), {}
+    for owner, rows in portfolios.items():
+        name = next((r[OWNER_COL] for r in rows if str(r.get(OWNER_COL, "")).strip()), owner)
+        # Wersje są lokalne dla backendu - źródło jest nadrzędne, więc ich nie porównujemy
+        records = [{c: v for c, v in r.items() if c != VERSION_COL} for r in rows]
+        if dst.save_user_data(name, records):
+            copied[owner] = len(records)
+        else:
+            logger.error("Nie udało się skopiować portfela %s", owner)
+    return copied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kopiowanie transakcji między arkuszem Google a bazą SQLite.")
+    parser.add_argument('--from', dest='source', choices=list(BACKENDS), required=True)
+    parser.add_argument('--to', dest='target', choices=list(BACKENDS), required=True)
+    parser.add_argument('--owners', nargs='+', help="tylko wybrani właściciele (domyślnie wszyscy)")
+    args = parser.parse_args(argv)
+    if args.source == args.target:
+        parser.error("źródło i cel muszą być różne")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    copied = copy_transactions(args.source, args.target, args.owners)
+    for owner, count in sorted(copied.items()):
+        logger.info("%-20s %5d transakcji", owner, count)
+    logger.info("Skopiowano %d portfeli: %s -> %s", len(copied), args.source, args.target)
+    return 0 if copied else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.environ.get(
+    "SUITSY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".suitsy_cache")
+)
+PRICE_DB = os.path.join(CACHE_DIR, "prices.sqlite")
+
+# Ostatnie dni pobieramy ponownie - wykrywamy w ten sposób korekty (splity, dywidendy)
+TAIL_OVERLAP_DAYS = 5
+ADJUSTMENT_TOLERANCE = 0.005
+
+
+def _day(ts):
+    return pd.Timestamp(ts).strftime('%Y-%m-%d')
+
+
+class PriceStore:
+    """Lokalny magazyn notowań (SQLite): ceny zamknięcia i pokryte zakresy dat per ticker."""
+
+    def __init__(self, path=PRICE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL, "
+                "PRIMARY KEY (ticker, date))"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "ticker TEXT PRIMARY KEY, start TEXT NOT NULL, end TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def coverage(self, tickers):
+        if not tickers:
+            return {}
+        marks = ",".join("?" * len(tickers))
+        with closing(self._connect()) as con:
+            rows = con.execute(f"SELECT ticker, start, end FROM coverage WHERE ticker IN ({marks})", list(tickers))
+            return {t: (pd.Timestamp(s), pd.Timestamp(e)) for t, s, e in rows}
+
+    def plan_fetch(self, tickers, start, today):
+        """Zwraca {(od, do): [tickery]} - tylko brakujące fragmenty historii, pogrupowane w paczki."""
+        start, today = pd.Timestamp(start).normalize(), pd.Timestamp(today).normalize()
+        cov = self.coverage(tickers)
+        plan = {}
+        for t in tickers:
+            if t not in cov:
+                windows = [(start, today)]
+            else:
+                c_start, c_end = cov[t]
+                windows = []
+                if start < c_start:
+                    windows.append((start, c_start - pd.Timedelta(days=1)))
+                if c_end < today:
+                    windows.append((c_end - pd.Timedelta(days=TAIL_OVERLAP_DAYS), today))
+            for w in windows:
+                plan.setdefault(w, []).append(t)
+        return plan
+
+    def write(self, closes, tickers, start, end):
+        """Zapisuje pobrane okno [start, end]. Zwraca tickery, których historia została skorygowana
+        przez dostawcę - ich dane są usuwane, by pobrać je ponownie w całości."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        # Dzisiejsza świeca może być jeszcze w trakcie sesji - pokrycie kończymy na wczoraj
+        covered_end = min(end, pd.Timestamp.now().normalize() - pd.Timedelta(days=1))
+        cov = self.coverage(tickers)
+        stale = []
+
+        with closing(self._connect()) as con, con:
+            for t in tickers:
+                col = closes[t].dropna() if t in closes.columns else pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+                if t in cov and not col.empty and self._adjusted(con, t, col, cov[t][1]):
+                    con.execute("DELETE FROM prices WHERE ticker = ?", (t,))
+                    con.execute("DELETE FROM coverage WHERE ticker = ?", (t,))
+                    stale.append(t)
+                    continue
+
+                con.executemany(
+                    "INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)",
+                    [(t, d, float(v)) for d, v in zip(col.index.strftime('%Y-%m-%d'), col.to_numpy())]
+                )
+                c_start, c_end = cov.get(t, (start, covered_end))
+                con.execute(
+                    "INSERT OR REPLACE INTO coverage (ticker, start, end) VALUES (?, ?, ?)",
+                    (t, _day(min(c_start, start)), _day(max(c_end, covered_end)))
+                )
+        return stale
+
+    @staticmethod
+    def _adjusted(con, ticker, col, covered_end):
+        # Porównujemy tylko dni zamknięte (w pokryciu) - zapisana świeca z trwającej sesji zmienia się
+        # z każdym notowaniem i nie świadczy o korekcie historii
+        last = min(col.index[-1], covered_end)
+        if last < col.index[0]:
+            return False
+        rows = con.execute(
+            "SELECT date, close FROM prices WHERE ticker = ? AND date >= ? AND date <= ?",
+            (ticker, _day(col.index[0]), _day(last))
+        ).fetchall()
+        if not rows:
+            return False
+        stored = pd.Series({pd.Timestamp(d): c for d, c in rows})
+        fresh = col.reindex(stored.index).dropna()
+        if fresh.empty:
+            return False
+        stored = stored.reindex(fresh.index)
+        return bool(np.any(np.abs(fresh.to_numpy() / stored.to_numpy() - 1) > ADJUSTMENT_TOLERANCE))
+
+    def read(self, tickers, start, end=None):
+        marks = ",".join("?" * len(tickers))
+        query = f"SELECT date, ticker, close FROM prices WHERE ticker IN ({marks}) AND date >= ?"
+        params = list(tickers) + [_day(start)]
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(_day(end))
+
+        with closing(self._connect()) as con:
+            rows = pd.DataFrame(con.execute(query, params).fetchall(), columns=['date', 'ticker', 'close'])
+        if rows.empty:
+            return pd.DataFrame()
+
+        data = rows.pivot(index='date', columns='ticker', values='close')
+        data.index = pd.to_datetime(data.index)
+        data.index.name = 'Date'
+        data.columns.name = None
+        return data.reindex(columns=[t for t in tickers if t in data.columns])
@@ -1,13 +1,24 @@
+import os
 import streamlit as st
 import pandas as pd
-from data.sheets import load_user_data
-from data.market import get_market_data, get_live_prices, get_live_currencies, get_benchmark_data
-from core.metrics import calculate_portfolio_metrics, calculate_portfolio_history, safe_float, safe_date
-from ui.sidebar import render_sidebar
-from ui.dashboard import render_kpi, render_main_ui
+from data.storage import load_user_data, load_transactions
+from data.cache import get_cache
+from data.market import load_market_data
+from data.snapshots import read_snapshot
+from core.metrics import calculate_portfolio_metrics, calculate_benchmark_roi, calculate_roi, last_valid_prices
+from core.analytics import calculate_risk_metrics
+from core.returns import time_weighted_return
+from core.portfolio import IncrementalHistory
+from core.timing import start_run, stage, configure_logging, frame_bytes
+from ui.sidebar import render_sidebar, render_debug_panel
+from ui.dashboard import render_live_kpi, render_main_ui, render_rejected
 
 st.set_page_config(page_title="Suitsy", layout="wide")
 
+# SUITSY_TIMING_LOG=1 - czasy etapów każdego przebiegu jako linie JSON na stderr
+if os.environ.get("SUITSY_TIMING_LOG"):
+    configure_logging()
+
 st.markdown("""
 <style>
     .stApp { background-color: #0E1117; }
@@ -24,6 +35,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 if 'username' not in st.session_state: st.session_state.username = None
+if 'history' not in st.session_state: st.session_state.history = IncrementalHistory()
 
 if not st.session_state.username:
     st.markdown("<h1 style='text-align: center;'>Suitsy Portfolio</h1>", unsafe_allow_html=True)
@@ -35,81 +47,75 @@ if not st.session_state.username:
     st.stop()
 
 u = st.session_state.username
-raw = load_user_data(u)
+run = start_run(counters=get_cache().totals, user=u)
+data_revision, raw = load_user_data(u)
 
+df = rejected = None
 if raw:
-    df = pd.DataFrame(raw)
-    df['Ilosc'] = df['Ilosc'].apply(safe_float)
-    df['Kwota_Poczatkowa_PLN'] = df['Kwota_Poczatkowa_PLN'].apply(safe_float)
-    df['Data_Zakupu'] = df['Data_Zakupu'].apply(safe_date)
-
-    with st.spinner("Ładowanie danych rynkowych..."):
-        min_d = pd.to_datetime(df['Data_Zakupu'].min())
-        tickers = df['Symbol'].unique().tolist()
-        currs = df['Waluta'].unique().tolist()
-
-        hist_p = get_market_data(tickers, min_d)
-
-        hist_f = get_benchmark_data([f"{c}PLN=X" for c in currs if c != 'PLN'], min_d)
-
-        live_p = get_live_prices(tickers)
-        live_f = get_live_currencies(currs)
-
-        df_fin = calculate_portfolio_metrics(df, hist_p, live_p, live_f)
-        eq_curve, cost_curve, eq_map = calculate_portfolio_history(df, hist_p, hist_f)
-
-        if not eq_curve.empty and len(eq_curve) > 1:
-            if not eq_curve.empty and len(eq_curve) > 1:
-                bench_opts = {
-                    "S&P 500": "^GSPC",
-                    "NASDAQ 100": "^NDX",
-                    "WIG20": "WIG20.WA",
-                    "Złoto": "GC=F",
-                    "Bitcoin": "BTC-USD"
-                }
-
-                first_trade_mask = cost_curve > 0
-                if first_trade_mask.any():
-                    first_trade_date = cost_curve[first_trade_mask].index[0]
-                else:
-                    first_trade_date = eq_curve.index[0]
-
-                roi_ser = pd.Series(0.0, index=eq_curve.index)
-                roi_ser[first_trade_mask] = ((eq_curve[first_trade_mask] / cost_curve[first_trade_mask]) - 1) * 100
-
-                selected_b = render_sidebar(u, raw)
-                b_roi = {}
-                for b in selected_b:
-                    if b in bench_opts:
-                        bd = get_benchmark_data(bench_opts[b], min_d)
-                        if not bd.empty:
-                            aligned = bd.reindex(eq_curve.index).ffill().bfill()
-
-                            try:
-                                price_at_start = aligned.loc[first_trade_date].iloc[0]
-                                b_roi[b] = (aligned.iloc[:, 0] / price_at_start - 1) * 100
-                                b_roi[b].loc[:first_trade_date] = 0
-                            except Exception:
-                                b_roi[b] = (aligned.iloc[:, 0] / aligned.iloc[0, 0] - 1) * 100
-
-                active_eq = eq_curve[first_trade_mask]
-                if not active_eq.empty:
-                    cummax = active_eq.cummax()
-                    drawdown = (active_eq - cummax) / cummax * 100
-                    max_dd = drawdown.min()
-                else:
-                    max_dd = 0
-                daily_chg = eq_curve.iloc[-1] - eq_curve.iloc[-2]
-                daily_pct = (daily_chg / eq_curve.iloc[-2] * 100) if eq_curve.iloc[-2] != 0 else 0
-
-                st.title("Suitsy")
-                render_kpi(eq_curve.iloc[-1], (eq_curve.iloc[-1] - cost_curve.iloc[-1]), roi_ser.iloc[-1], max_dd,
-                           daily_chg, daily_pct)
-                render_main_ui(df_fin, eq_map, roi_ser, b_roi)
-        else:
-            st.warning("Brak wystarczających danych historycznych do wygenerowania wykresów.")
+    with stage('ingest', rows=len(raw)) as timing:
+        df, rejected = load_transactions(u, raw, data_revision)
+        timing['rejected'] = len(rejected)
+
+if df is not None and not df.empty:
+    selected_b = render_sidebar(u, raw)
+    render_rejected(rejected)
+
+    # Pierwsza wizyta w sesji: gotowy wynik z batch.py, jeśli policzono go dla aktualnej wersji arkusza
+    snap = None
+    if 'first_visit' not in st.session_state:
+        st.session_state.first_visit = False
+        with stage('snapshot') as timing:
+            snap = read_snapshot(u, data_revision)
+            timing['cache_hits' if snap is not None else 'cache_misses'] = 1
+
+    if snap is not None:
+        df_fin, eq_curve, cost_curve, eq_map = snap['metrics'], snap['equity'], snap['cost'], snap['equity_map']
+        last_prices = snap['last_prices']
+    else:
+        with st.spinner("Ładowanie danych rynkowych..."):
+            min_d = pd.to_datetime(df['Data_Zakupu'].min())
+            tickers = df['Symbol'].unique().tolist()
+            currs = df['Waluta'].unique().tolist()
+
+            with stage('market', symbols=len(tickers)) as timing:
+                hist_p, hist_f, hist_b, live_p, live_f = load_market_data(tickers, currs, selected_b, min_d)
+                timing['rows'] = len(hist_p)
+                timing['bytes'] = frame_bytes(hist_p, hist_f, hist_b)
+
+            with stage('metrics', rows=len(df)):
+                df_fin = calculate_portfolio_metrics(df, hist_p, live_p, live_f)
+                last_prices = last_valid_prices(hist_p)
+            with stage('history', rows=len(df)):
+                eq_curve, cost_curve, eq_map = st.session_state.history.update(df, hist_p, hist_f)
+
+    if not eq_curve.empty and len(eq_curve) > 1:
+        roi_ser, first_trade_date = calculate_roi(eq_curve, cost_curve)
+
+        with stage('analytics', rows=len(eq_curve)):
+            if snap is not None:
+                twr = snap['twr']
+                # Migawka ma wszystkie benchmarki - pokazujemy tylko wybrane
+                b_roi = snap['bench_roi'][[b for b in selected_b if b in snap['bench_roi'].columns]]
+                risk = dict(snap['risk'], benchmarks=snap['risk']['benchmarks'].loc[
+                    [b for b in selected_b if b in snap['risk']['benchmarks'].index]])
+            else:
+                twr = time_weighted_return(eq_curve, cost_curve)
+                b_roi = calculate_benchmark_roi(hist_b, eq_curve.index, first_trade_date)
+                risk = calculate_risk_metrics(eq_curve, cost_curve, hist_b)
+        max_dd = risk['summary']['Max_DD_Proc']
+
+        st.title("Suitsy")
+        # KPI i tabela odświeżają się same z notowań live (fragmenty) - historia liczona jest tylko tutaj
+        render_live_kpi(df_fin, last_prices, eq_curve, cost_curve, max_dd)
+        with stage('render'):
+            render_main_ui(df_fin, eq_map, roi_ser, b_roi, risk, last_prices, twr)
+    else:
+        st.warning("Brak wystarczających danych historycznych do wygenerowania wykresów.")
 else:
-    render_sidebar(u, [])
+    # Także gdy wszystkie wiersze zostały odrzucone - można je poprawić lub usunąć w sidebarze
+    render_sidebar(u, raw)
     st.title("Suitsy")
+    render_rejected(rejected)
     st.info("Brak danych w portfelu.")
 
+render_debug_panel(run)
@@ -0,0 +1,64 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+from core.digest import digest
+
+# Czyste funkcje budujące wykresy - bez streamlit, więc można je mierzyć i zapamiętywać niezależnie od UI
+
+
+def figure_key(name, *inputs):
+    """Skrót nazwy wykresu i jego danych wejściowych - klucz pamięci podręcznej wykresu."""
+    return digest(name, *inputs)
+
+
+def equity_figure(eq_df):
+    sorted_cols = eq_df.iloc[-1].sort_values(ascending=False).index
+    fig = px.area(eq_df[sorted_cols], template="plotly_dark",
+                  color_discrete_sequence=px.colors.qualitative.Bold)
+    fig.update_layout(height=450, paper_bgcolor='rgba(0,0,0,0)', xaxis_title=None, yaxis_title="PLN",
+                      hovermode='x unified')
+    return fig
+
+
+def roi_figure(roi_series, bench_roi, twr=None):
+    fig = go.Figure()
+    for bn, br in bench_roi.items():
+        fig.add_trace(go.Scatter(x=br.index, y=br, mode='lines', name=bn, line=dict(dash='dot', width=1)))
+    if twr is not None:
+        # Zwrot ważony czasem - bez wpływu terminów wpłat, porównywalny z benchmarkami
+        fig.add_trace(go.Scatter(x=twr.index, y=twr, mode='lines', name='Twój Portfel (TWR)',
+                                 line=dict(color='#2962FF', width=2)))
+    fig.add_trace(go.Scatter(x=roi_series.index, y=roi_series, mode='lines', name='Twój Portfel',
+                             line=dict(color='#FAFAFA', width=3)))
+    fig.update_layout(template="plotly_dark", height=450, paper_bgcolor='rgba(0,0,0,0)', yaxis_title="ROI (%)",
+                      hovermode='x unified')
+    return fig
+
+
+def allocation_figure(alloc):
+    return px.pie(alloc, values='Wartosc_PLN', names='Symbol', hole=0.5, template="plotly_dark")
+
+
+def drawdown_figure(dd):
+    fig = go.Figure(go.Scatter(x=dd.index, y=dd['Obsuniecie_Proc'], mode='lines', fill='tozeroy',
+                               name='Obsunięcie', line=dict(color='#FF5252', width=1)))
+    fig.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)', yaxis_title="DD (%)",
+                      hovermode='x unified')
+    return fig
+
+
+def volatility_figure(roll):
+    fig = go.Figure(go.Scatter(x=roll.index, y=roll['Zmiennosc_Proc'], mode='lines', name='Zmienność',
+                               line=dict(color='#2962FF', width=1)))
+    fig.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)',
+                      yaxis_title="Zmienność krocząca (%)", hovermode='x unified')
+    return fig
+
+
+FIGURES = {
+    'equity': equity_figure,
+    'roi': roi_figure,
+    'allocation': allocation_figure,
+    'drawdown': drawdown_figure,
+    'volatility': volatility_figure,
+}
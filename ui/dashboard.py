@@ -1,57 +1,256 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+import html
+from datetime import datetime
+import threading
+from core.timing import stage
+from core.downsample import build_pyramid, downsample
+from core.metrics import calculate_portfolio_metrics, patch_live_point
+from core.returns import group_xirr
+from data.market import get_live_prices, get_live_currencies, invalidate_live
+from ui.charts import FIGURES, figure_key
 
+JOURNAL_PAGE_SIZE = 25
+VIEWS = ["Wartość", "ROI", "Alokacja", "Dziennik", "Tabela", "Ryzyko"]
+FIGURE_CACHE_SIZE = 64
+LIVE_REFRESH_SECONDS = 60  # notowania i tak pochodzą z cache "live" (TTL 5 min)
+TABLE_COLUMNS = ['Symbol', 'Data_Zakupu', 'Cena_Live', 'Wartosc_PLN', 'Zysk_PLN', 'Zysk_Proc', 'XIRR_Proc', 'Notatka']
+XIRR_HELP = "Roczna stopa zwrotu ważona kapitałem (XIRR); puste dla okresów krótszych niż rok"
+TABLE_CONFIG = {'Data_Zakupu': st.column_config.DateColumn(format="YYYY-MM-DD"),
+                'XIRR_Proc': st.column_config.NumberColumn(format="%.2f", help=XIRR_HELP)}
+# Zakresy wykresów czasowych (dni wstecz od ostatniego notowania)
+CHART_RANGES = {"1M": 31, "6M": 183, "1R": 365, "3R": 3 * 365, "5R": 5 * 365, "Max": None}
 
-def render_kpi(total, profit, roi, max_dd, daily_chg, daily_pct):
-    c1, c2, c3, c4 = st.columns(4)
+
+def render_kpi(total, profit, roi, max_dd, daily_chg, daily_pct, xirr=np.nan, unvalued=0):
+    c1, c2, c3, c4, c5 = st.columns(5)
     c1.metric("Dzisiaj", f"{daily_chg:+,.0f} PLN", f"{daily_pct:+.2f}%")
     c2.metric("Wycena", f"{total:,.0f} PLN")
     c3.metric("Zysk", f"{profit:+,.0f} PLN", f"{roi:+.2f}%")
-    c4.metric("Max DD", f"{max_dd:.2f}%")
+    # Pozycje bez wyceny nie wchodzą do XIRR - wynik jest wtedy oznaczony jako częściowy
+    partial = f"; częściowy - bez {unvalued} pozycji bez wyceny" if unvalued else ""
+    c4.metric("Zwrot roczny" + ("*" if unvalued else ""), f"{xirr:+.2f}%" if np.isfinite(xirr) else "—",
+              help=XIRR_HELP + partial)
+    c5.metric("Max DD", f"{max_dd:.2f}%")
+
+
+def _live_pairs(df):
+    return [f"{c}PLN=X" for c in df['Waluta'].unique() if c != 'PLN']
+
+
+def live_metrics(df, last_prices):
+    """Wycena pozycji z bieżących notowań - jedno zapytanie o symbole i pary walut (albo trafienie w cache)."""
+    symbols = df['Symbol'].unique().tolist()
+    quotes = get_live_prices(symbols + _live_pairs(df))
+    live_p = {s: quotes[s] for s in symbols if s in quotes}
+    live_f = get_live_currencies(df['Waluta'].unique().tolist())  # pary są już w cache "live"
+    # Ostatnie ceny z historii w formie jednowierszowej ramki - fallback, gdy brak notowania live
+    return calculate_portfolio_metrics(df, last_prices.to_frame().T, live_p, live_f)
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_kpi(df, last_prices, equity, cost, max_dd):
+    # Fragment: odświeżenie notowań przelicza tylko ostatni punkt krzywej i wiersz KPI, bez historii i wykresów
+    kpi = st.container()
+    c1, c2 = st.columns([1, 4])
+    if c1.button("Odśwież (Live)", type="primary", use_container_width=True):
+        invalidate_live(df['Symbol'].unique().tolist() + _live_pairs(df))
+
+    now = datetime.now()
+    live = live_metrics(df, last_prices)
+    # Te same pozycje co w krzywej kapitału: symbol z historią notowań, zakup najpóźniej dziś
+    held = live['Symbol'].isin(last_prices.index) & (pd.to_datetime(live['Data_Zakupu']) <= pd.Timestamp(now))
+    # Pozycje bez wyceny (brak kursu waluty) - jak w historii: poza wartością i kosztem, a nie liczone po 0
+    valued = held & live['Wartosc_PLN'].notna()
+    unvalued = int((held & ~valued).sum())
+    equity, cost = patch_live_point(equity, cost, live.loc[valued, 'Wartosc_PLN'].sum(),
+                                    live.loc[valued, 'Kwota_Poczatkowa_PLN'].sum(), now)
+
+    prev, last, invested = equity.iloc[-2], equity.iloc[-1], cost.iloc[-1]
+    daily_chg = last - prev
+    daily_pct = (daily_chg / prev * 100) if prev != 0 else 0
+    roi = ((last / invested) - 1) * 100 if invested > 0 else 0
+    xirr = group_xirr(live.loc[valued, 'Kwota_Poczatkowa_PLN'], live.loc[valued, 'Wartosc_PLN'],
+                      live.loc[valued, 'Data_Zakupu'], np.zeros(valued.sum()), now).iloc[0] if valued.any() else np.nan
+    with kpi:
+        render_kpi(last, last - invested, roi, max_dd, daily_chg, daily_pct, xirr, unvalued)
+    c2.caption(f"Notowania live z {now:%H:%M:%S}"
+               + (f" · {unvalued} pozycji bez wyceny pominięto w wycenie i koszcie" if unvalued else ""))
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_live_table(df, last_prices):
+    st.dataframe(live_metrics(df, last_prices)[TABLE_COLUMNS], use_container_width=True, hide_index=True,
+                 column_config=TABLE_CONFIG)
+
+
+_builds = threading.local()  # licznik zbudowanych wykresów w wątku przebiegu - odróżnia trafienie od chybienia
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+def _figure_payload(name, key, _inputs):
+    # Klucz to skrót danych (figure_key) - argumenty z "_" nie są hashowane przez streamlit
+    _builds.count = getattr(_builds, 'count', 0) + 1
+    fig = FIGURES[name](*_inputs)
+    return fig.to_dict(), len(fig.to_json())
+
+
+def render_figure(name, *inputs):
+    """Wykres z pamięci podręcznej: budowany tylko, gdy zmieniły się jego dane wejściowe."""
+    with stage('figure', chart=name) as timing:
+        builds = getattr(_builds, 'count', 0)
+        payload, size = _figure_payload(name, figure_key(name, *inputs), inputs)
+        timing['cache_misses' if getattr(_builds, 'count', 0) > builds else 'cache_hits'] = 1
+        timing['points'] = sum(len(t.get('x', t.get('values', ()))) for t in payload['data'])
+        timing['bytes'] = size
+        st.plotly_chart(payload, use_container_width=True)
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+def _pyramid(key, _frame):
+    return build_pyramid(_frame)
+
+
+def select_range(index):
+    """Selektor zakresu wykresu - zwraca datę początku widocznego okresu (None = całość)."""
+    choice = st.segmented_control("Zakres", list(CHART_RANGES), default="Max", key="chart_range",
+                                  label_visibility="collapsed") or "Max"
+    days = CHART_RANGES[choice]
+    return index[-1] - pd.Timedelta(days=days) if days else None
 
 
-def render_main_ui(df, equity_map, roi_series, bench_roi):
-    t1, t2, t3, t4, t5 = st.tabs(["Wartość", "ROI", "Alokacja", "Dziennik", "Tabela"])
+def sampled(frame, start, anchor=None):
+    """Ramka do wykresu: widoczny zakres przerzedzony z piramidy liczonej raz na dane wejściowe."""
+    return downsample(_pyramid(figure_key('pyramid', frame), frame), start, anchor=anchor)
 
-    with t1:
+
+def build_journal_html(page):
+    """Karty dziennika dla jednej strony - składane kolumnami, wysyłane jako jeden element."""
+    if page.empty:
+        return ""
+    # Pozycja bez wyceny (np. waluta bez kursu) - neutralny opis zamiast koloru zysku/straty
+    priced = np.isfinite(page['Zysk_PLN'].to_numpy(dtype=float)) & np.isfinite(page['Zysk_Proc'].to_numpy(dtype=float))
+    color = pd.Series(np.where(~priced, "#9CA3AF", np.where(page['Zysk_PLN'] >= 0, "#00E676", "#FF5252")),
+                      index=page.index)
+    result = (page['Zysk_PLN'].map('{:+.0f}'.format) + ' PLN (' + page['Zysk_Proc'].map('{:+.1f}'.format)
+              + '%)').where(priced, "brak wyceny")
+    note = page['Notatka'].fillna("").astype(str)
+    note = note.where(note.str.strip() != "", "Brak notatki.").map(html.escape)
+    cards = (
+        '<div class="journal-card"><div class="journal-date">' + page['Data_Zakupu'].astype(str)
+        + '</div><div class="journal-header">' + page['Symbol'].astype(str).map(html.escape)
+        + ' <span style="font-weight:normal">(' + page['Kwota_Poczatkowa_PLN'].map('{:.0f}'.format)
+        + ' PLN)</span><span style="float:right;color:' + color + '">' + result
+        + '</span></div><div class="journal-note">'
+        + note + '</div></div>'
+    )
+    return "".join(cards)
+
+
+@st.fragment
+def render_journal(df):
+    # Fragment: filtry i zmiana strony przeliczają tylko dziennik, nie całą aplikację
+    journal = df.sort_values('Data_Zakupu', ascending=False)
+    dates = pd.to_datetime(journal['Data_Zakupu'])
+
+    c1, c2 = st.columns(2)
+    symbols = c1.multiselect("Symbol", sorted(journal['Symbol'].astype(str).unique()), key="journal_symbols")
+    date_range = c2.date_input("Zakres dat", (dates.min().date(), dates.max().date()), key="journal_dates")
+
+    mask = pd.Series(True, index=journal.index)
+    if symbols:
+        mask &= journal['Symbol'].astype(str).isin(symbols)
+    if len(date_range) == 2:
+        mask &= dates.between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]))
+    journal = journal[mask]
+
+    pages = max(1, -(-len(journal) // JOURNAL_PAGE_SIZE))
+    if "journal_page" not in st.session_state or \
+            st.session_state.get("journal_filter") != (tuple(symbols), tuple(date_range)):
+        st.session_state["journal_filter"] = (tuple(symbols), tuple(date_range))
+        st.session_state["journal_page"] = 1
+    page = st.number_input(f"Strona (z {pages})", min_value=1, max_value=pages, key="journal_page")
+    start = (min(page, pages) - 1) * JOURNAL_PAGE_SIZE
+    st.caption(f"Transakcje {min(start + 1, len(journal))}–{min(start + JOURNAL_PAGE_SIZE, len(journal))} z {len(journal)}")
+    st.markdown(build_journal_html(journal.iloc[start:start + JOURNAL_PAGE_SIZE]), unsafe_allow_html=True)
+
+
+def render_positions(df):
+    """Pozycje (symbole): koszt, wycena, zysk i zwrot roczny z wszystkich zakupów danego symbolu."""
+    positions = df.groupby('Symbol', observed=True)[['Kwota_Poczatkowa_PLN', 'Wartosc_PLN', 'Zysk_PLN']].sum()
+    xirr = group_xirr(df['Kwota_Poczatkowa_PLN'], df['Wartosc_PLN'].where(df['Cena_Live'] > 0), df['Data_Zakupu'],
+                      df['Symbol'])
+    positions['XIRR_Proc'] = xirr.reindex(positions.index.astype(str)).to_numpy()
+    st.dataframe(positions.round(2), use_container_width=True,
+                 column_config={'XIRR_Proc': st.column_config.NumberColumn(help=XIRR_HELP)})
+
+
+def render_rejected(rejected):
+    """Wiersze arkusza pominięte przy wczytywaniu (niepoprawna liczba lub data, brak symbolu)."""
+    if rejected is None or rejected.empty:
+        return
+    st.warning(f"Pominięto {len(rejected)} transakcji z błędami w arkuszu - popraw je lub usuń w sidebarze.")
+    with st.expander("Odrzucone wiersze"):
+        st.dataframe(rejected, use_container_width=True, hide_index=True)
+
+
+def render_main_ui(df, equity_map, roi_series, bench_roi, risk=None, last_prices=None, twr=None):
+    # Zamiast st.tabs (liczą i wysyłają wszystkie karty) budujemy tylko aktywny widok
+    view = st.segmented_control("Widok", VIEWS, default=VIEWS[0], key="main_view",
+                                label_visibility="collapsed") or VIEWS[0]
+
+    if view == "Wartość":
         st.subheader("Wartość portfela w czasie")
         eq_df = pd.DataFrame(equity_map).fillna(0)
         if not eq_df.empty:
-            sorted_cols = eq_df.iloc[-1].sort_values(ascending=False).index
-            fig = px.area(eq_df[sorted_cols], template="plotly_dark",
-                          color_discrete_sequence=px.colors.qualitative.Bold)
-            fig.update_layout(height=450, paper_bgcolor='rgba(0,0,0,0)', xaxis_title=None, yaxis_title="PLN",
-                              hovermode='x unified')
-            st.plotly_chart(fig, use_container_width=True)
-
-    with t2:
+            render_figure('equity', sampled(eq_df, select_range(eq_df.index)))
+
+    elif view == "ROI":
         st.subheader("Zwrot z inwestycji (ROI)")
-        fig_roi = go.Figure()
-        for bn, br in bench_roi.items():
-            fig_roi.add_trace(go.Scatter(x=br.index, y=br, mode='lines', name=bn, line=dict(dash='dot', width=1)))
-        fig_roi.add_trace(go.Scatter(x=roi_series.index, y=roi_series, mode='lines', name='Twój Portfel',
-                                     line=dict(color='#FAFAFA', width=3)))
-        fig_roi.update_layout(template="plotly_dark", height=450, paper_bgcolor='rgba(0,0,0,0)', yaxis_title="ROI (%)",
-                              hovermode='x unified')
-        st.plotly_chart(fig_roi, use_container_width=True)
-
-    with t3:
+        roi = bench_roi.copy()
+        roi['_portfel'] = roi_series
+        if twr is not None:
+            roi['_twr'] = twr
+        # Punkty wybierane na serii portfela, te same dla benchmarków
+        roi = sampled(roi, select_range(roi.index), anchor='_portfel')
+        render_figure('roi', roi['_portfel'], roi.drop(columns=['_portfel', '_twr'], errors='ignore'), roi.get('_twr'))
+        st.caption("ROI to wycena względem sumy wpłat; TWR pomija wpływ terminów wpłat i jest porównywalny z benchmarkami.")
+
+    elif view == "Alokacja":
         st.subheader("Alokacja aktywów")
-        alloc = df.groupby('Symbol')['Wartosc_PLN'].sum().reset_index()
-        fig = px.pie(alloc, values='Wartosc_PLN', names='Symbol', hole=0.5, template="plotly_dark")
-        st.plotly_chart(fig, use_container_width=True)
+        render_figure('allocation', df.groupby('Symbol', observed=True)['Wartosc_PLN'].sum().reset_index())
+        render_positions(df)
 
-    with t4:
+    elif view == "Dziennik":
         st.subheader("Dziennik transakcji")
-        for _, row in df.sort_values('Data_Zakupu', ascending=False).iterrows():
-            color = "#00E676" if row['Zysk_PLN'] >= 0 else "#FF5252"
-            st.markdown(
-                f"""<div class="journal-card"><div class="journal-date">{row['Data_Zakupu']}</div><div class="journal-header">{row['Symbol']} <span style="font-weight:normal">({row['Kwota_Poczatkowa_PLN']:.0f} PLN)</span><span style="float:right;color:{color}">{row['Zysk_PLN']:+.0f} PLN ({row['Zysk_Proc']:+.1f}%)</span></div><div class="journal-note">{row['Notatka'] if row['Notatka'] else "Brak notatki."}</div></div>""",
-                unsafe_allow_html=True)
+        render_journal(df)
 
-    with t5:
+    elif view == "Tabela":
         st.subheader("Szczegółowa tabela")
-        st.dataframe(df[['Symbol', 'Data_Zakupu', 'Cena_Live', 'Wartosc_PLN', 'Zysk_PLN', 'Zysk_Proc', 'Notatka']],
-                     use_container_width=True, hide_index=True)
\ No newline at end of file
+        if last_prices is not None:
+            render_live_table(df, last_prices)
+        else:
+            st.dataframe(df[TABLE_COLUMNS], use_container_width=True, hide_index=True, column_config=TABLE_CONFIG)
+
+    else:
+        st.subheader("Analiza ryzyka")
+        if risk is None:
+            st.info("Brak danych do analizy ryzyka.")
+        else:
+            render_risk(risk)
+
+
+def render_risk(risk):
+    s = risk['summary']
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Zmienność (rocznie)", f"{s['Zmiennosc_Proc']:.2f}%")
+    c2.metric("Sharpe", f"{s['Sharpe']:.2f}")
+    c3.metric("Sortino", f"{s['Sortino']:.2f}")
+    c4.metric("Najdłuższe DD", f"{s['Najdluzsze_DD_Dni']:.0f} sesji")
+
+    render_figure('drawdown', risk['drawdown'])
+    render_figure('volatility', risk['rolling'])
+
+    if not risk['benchmarks'].empty:
+        st.dataframe(risk['benchmarks'].round(3), use_container_width=True)
\ No newline at end of file
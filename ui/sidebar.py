@@ -1,9 +1,10 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-from datetime import datetime, timedelta
-from data.market import validate_ticker, get_currency_rate
-from data.sheets import save_user_data
+from datetime import datetime
+from data.cache import get_cache
+from data.instruments import resolve_instrument, get_trade_quote
+from data.market import BENCHMARKS, get_shared_store, invalidate_live
+from data.storage import append_transaction, update_transaction, delete_transaction
 
 
 def render_sidebar(username, portfolio):
@@ -16,18 +17,12 @@ def render_sidebar(username, portfolio):
             st.session_state.username = None
             st.rerun()
 
-        st.markdown("---")
-        st.markdown("## Zarządzanie")
-        if st.button("Odśwież (Live)", type="primary", use_container_width=True):
-            st.cache_data.clear()
-            st.rerun()
-
         st.markdown("---")
         show_bench = st.checkbox("Pokaż Benchmark", value=True)
         benchmarks = (
             st.multiselect(
                 "Benchmarki:",
-                ["S&P 500", "NASDAQ 100", "WIG20", "Złoto", "Bitcoin"],
+                list(BENCHMARKS),
                 default=["S&P 500"]
             )
             if show_bench
@@ -46,35 +41,26 @@ def render_sidebar(username, portfolio):
                 n_in = st.text_area("Notatka")
                 
                 if st.form_submit_button("Dodaj"):
-                    # Walidacja tickera
-                    symbol, err = validate_ticker(t_in)
+                    # Walidacja tickera (rejestr instrumentów, cache 24h)
+                    symbol, asset_curr, err = resolve_instrument(t_in)
                     if err:
                         st.error(err)
                     else:
                         with st.spinner("Przeliczam..."):
                             try:
-                                t_obj = yf.Ticker(symbol)
-                                info = t_obj.info
-                                asset_curr = info.get('currency', 'USD').upper()
-
-                                start = d_in - timedelta(days=5)
-                                end = d_in + timedelta(days=5)
-                                hist = t_obj.history(start=start, end=end)
+                                price_date, price, rates = get_trade_quote(symbol, d_in, {c_in, asset_curr})
                                 
-                                if hist.empty:
+                                if price is None:
                                     st.error("Brak ceny dla tej daty! Spróbuj innej daty lub sprawdź symbol.")
+                                elif c_in not in rates or asset_curr not in rates:
+                                    st.error("Brak kursu walut dla tej daty! Spróbuj innej daty.")
                                 else:
-                                    hist.index = pd.to_datetime(hist.index).date
-
-                                    if d_in in hist.index:
-                                        price = float(hist.loc[d_in]['Close'])
+                                    if price_date == d_in:
                                         st.success(f"✓ Cena z {d_in}: {price:.2f} {asset_curr}")
                                     else:
-                                        closest_date = min(hist.index, key=lambda x: abs(x - d_in))
-                                        price = float(hist.loc[closest_date]['Close'])
-                                        st.info(f"ℹ️ Użyto ceny z {closest_date}: {price:.2f} {asset_curr}")
-                                    r_user = get_currency_rate(f"{c_in}PLN=X") if c_in != 'PLN' else 1.0
-                                    r_asset = get_currency_rate(f"{asset_curr}PLN=X") if asset_curr != 'PLN' else 1.0
+                                        st.info(f"ℹ️ Użyto ceny z {price_date}: {price:.2f} {asset_curr}")
+                                    r_user = rates[c_in]
+                                    r_asset = rates[asset_curr]
 
                                     if c_in != 'PLN':
                                         st.info(f"Kurs {c_in}/PLN: {r_user:.4f}")
@@ -91,18 +77,19 @@ def render_sidebar(username, portfolio):
                                     - Koszt całkowity: {cost_pln:.2f} PLN
                                     """)
                                     
-                                    portfolio.append({
+                                    record = {
                                         'Symbol': symbol,
                                         'Data_Zakupu': d_in.strftime('%Y-%m-%d'),
                                         'Waluta': asset_curr,
                                         'Ilosc': qty,
                                         'Kwota_Poczatkowa_PLN': cost_pln,
                                         'Notatka': n_in
-                                    })
+                                    }
 
-                                    if save_user_data(username, portfolio):
+                                    if append_transaction(username, record):
+                                        portfolio.append(record)
                                         st.success("✅ Transakcja dodana!")
-                                        st.cache_data.clear()  
+                                        invalidate_live([symbol])
                                         st.rerun()
                                     else:
                                         st.error("Błąd zapisu do bazy danych")
@@ -123,8 +110,7 @@ def render_sidebar(username, portfolio):
                 new_n = st.text_area("Treść", value=portfolio[i].get('Notatka', ""))
                 
                 if st.button("Zapisz", key="save_note"):
-                    portfolio[i]['Notatka'] = new_n
-                    if save_user_data(username, portfolio):
+                    if update_transaction(username, portfolio[i], {'Notatka': new_n}):
                         st.success("✅ Notatka zaktualizowana!")
                         st.rerun()
                     else:
@@ -144,16 +130,40 @@ def render_sidebar(username, portfolio):
                 
                 if st.button("Usuń trwale", type="secondary"):
                     i_del = int(idx_del.split('.')[0]) - 1
-                    deleted = portfolio.pop(i_del)
+                    deleted = portfolio[i_del]
                     
-                    if save_user_data(username, portfolio):
+                    if delete_transaction(username, deleted):
+                        portfolio.pop(i_del)
                         st.success(f"✅ Usunięto {deleted['Symbol']}")
-                        st.cache_data.clear()
                         st.rerun()
                     else:
                         st.error("Błąd zapisu")
             else:
                 st.info("Brak transakcji do usunięcia")
+
+        st.markdown("---")
+        st.checkbox("Panel diagnostyczny", key="debug_timing")
         
         return benchmarks
 
+
+def render_debug_panel(run):
+    """Czasy etapów bieżącego przebiegu (włączane checkboxem w sidebarze)."""
+    if run is None or not st.session_state.get("debug_timing"):
+        return
+    with st.sidebar.expander("⏱️ Czasy etapów", expanded=True):
+        st.caption(f"Przebieg {run.id}: {run.elapsed_ms():.0f} ms")
+        stages = pd.DataFrame(run.stages)
+        stages = stages[['stage', 'ms'] + [c for c in stages.columns if c not in ('stage', 'ms')]]
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+
+        # Liczniki pamięci podręcznej per zakres - od startu procesu, wspólne dla wszystkich sesji
+        st.caption("Pamięć podręczna (cały proces): trafienia, chybienia, unieważnienia i wpisy per zakres")
+        st.dataframe(pd.DataFrame(get_cache().stats()).T, use_container_width=True)
+
+        mem = get_shared_store().footprint()
+        st.caption(f"Wspólne notowania: {mem['bytes'] / 2 ** 20:.1f} / {mem['limit'] / 2 ** 20:.0f} MB "
+                   f"({mem['dtype']}{', mmap' if mem['mapped'] else ''}), usunięte symbole: {mem['evicted']}")
+        if mem['scopes']:
+            st.dataframe(pd.DataFrame(mem['scopes']).T, use_container_width=True)
+